@@ -8,6 +8,9 @@ Classes:
         filtering operations
     ElasticDataFrame (deprecated): Api for elasticsearch with pandas-style
         filtering operations
+    ResultCache: Client-side cache for the results of elasticsearch requests
+    AsyncSearch: Handle of a search running asynchronously in elasticsearch
+    Slice: Part of a dataframe's documents which is read independently
 
 Functions:
     boost: Boosts the weight of query by a value
@@ -18,18 +21,24 @@ Exceptions:
     FieldConflictError: Raise when a root field conflicts with a namespace
     MissingMappingError: Raise when no mapping could be found for an index
     MissingQueryError: Raise when no query has been defined
+    SearchTimeoutError: Raise when an asynchronous search does not complete in time
 """
-import pkg_resources
-
+from .async_search import AsyncSearch
+from .cache import ResultCache
 from .config import config
 from .dataframe import DataFrame, ElasticDataFrame
 from .exceptions import (BadOperatorError, FieldConflictError,
-                         MissingMappingError, MissingQueryError)
+                         MissingMappingError, MissingQueryError,
+                         SearchTimeoutError)
 from .queries import boost
+from .slices import Slice
 
 __all__ = [
     'DataFrame',
     'ElasticDataFrame',
+    'ResultCache',
+    'AsyncSearch',
+    'Slice',
 
     'boost',
     'config',
@@ -37,6 +46,7 @@ __all__ = [
     'BadOperatorError',
     'FieldConflictError',
     'MissingMappingError',
-    'MissingQueryError'
+    'MissingQueryError',
+    'SearchTimeoutError'
 ]
-__version__ = pkg_resources.get_distribution('elasticsearch-bamboo').version
+__version__ = '0.3.2'
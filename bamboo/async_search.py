@@ -0,0 +1,160 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Handles of searches running asynchronously in elasticsearch."""
+import time
+
+from .config import config
+from .exceptions import SearchTimeoutError
+
+
+def _make_path(*parts):
+    """Get the url of an api from its parts."""
+    from elasticsearch.client.utils import _make_path
+    return _make_path(*parts)
+
+
+def _escape(value):
+    """Format a url parameter as the client does for its own apis."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return ','.join(value)
+    return value
+
+
+class AsyncSearch(object):
+    """Handle of a search running in elasticsearch.
+
+    Results are kept by elasticsearch until the search expires, so a
+    search can be resumed from its id, e.g. after a process restart,
+    with `AsyncSearch(id)`.
+
+    Attributes:
+        id: Id of the search in elasticsearch
+        key: Dot-separated path of the part of the search response which
+            is returned, e.g. `aggregations`. The whole response if None.
+        config: Configuration object for elasticsearch
+    """
+
+    config = config
+    # longest wait of a single request, below common proxy timeouts
+    poll_interval = 30
+
+    def __init__(self, id, key=None, config=None):
+        """Init AsyncSearch.
+
+        Args:
+            id (str): Id of the search in elasticsearch
+            key (str, optional): Dot-separated path of the part of the search
+                response to return, e.g. `aggregations`. Defaults to None,
+                the whole response.
+            config (config.Config, optional): Configuration object. If none
+                provided then uses mutable config.config in global namespace.
+                Defaults to None.
+        """
+        self.id = id
+        self.key = key
+        self.config = config or self.config
+        self._status = None
+
+    def __repr__(self):
+        return "{}(id='{}', key={})".format(type(self).__name__, self.id, self.key)
+
+    @classmethod
+    def submit(cls, es, index, body, key=None, config=None, keep_alive='5d', **params):
+        """Start a search.
+
+        Args:
+            es (Elasticsearch): Client for the cluster
+            index (str): Names of the indices to search
+            body (dict): Body of the search
+            key (str, optional): Part of the search response to return.
+                Defaults to None.
+            config (config.Config, optional): Configuration object.
+                Defaults to None.
+            keep_alive (str, optional): How long elasticsearch keeps the
+                search and its results. Defaults to 5 days.
+            **params (dict): Additional parameters of the search
+
+        Returns:
+            AsyncSearch: Handle of the search
+        """
+        params = dict({k: _escape(v) for k, v in params.items()},
+                      keep_alive=keep_alive,
+                      keep_on_completion='true',
+                      wait_for_completion_timeout='0s')
+        path = _make_path(index, '_async_search')
+        status = es.transport.perform_request('POST', path, params=params, body=body)
+        search = cls(status['id'], key=key, config=config)
+        search._status = status
+        return search
+
+    def done(self):
+        """Whether the search has completed.
+
+        Returns:
+            bool: True if the search is no longer running
+        """
+        if self._status is None or self._status['is_running']:
+            self._poll()
+        return not self._status['is_running']
+
+    def partial(self):
+        """Get the results gathered so far, without waiting for the rest.
+
+        Returns:
+            dict: The partial results, such as aggregations over the shards
+                which have been searched.
+        """
+        if self._status is None or self._status['is_running']:
+            self._poll()
+        return self.__extract(self._status)
+
+    def result(self, timeout=None):
+        """Wait for the search to complete and get its results.
+
+        Args:
+            timeout (float, optional): Seconds to wait. If None then waits
+                until the search completes. Defaults to None.
+
+        Returns:
+            dict: The results of the search
+
+        Raises:
+            SearchTimeoutError: If the search is still running after the timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self._status is None or self._status['is_running']:
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = max(min(wait, deadline - time.time()), 0)
+            self._poll(wait)
+            if (deadline is not None and self._status['is_running']
+                    and time.time() >= deadline):
+                raise SearchTimeoutError(self.id, timeout)
+        return self.__extract(self._status)
+
+    def cancel(self):
+        """Stop the search and delete its results."""
+        self._es.transport.perform_request('DELETE', _make_path('_async_search', self.id))
+
+    @property
+    def _es(self):
+        return self.config.connection
+
+    def _poll(self, wait=None):
+        """Get the current status and results of the search."""
+        params = {}
+        if wait is not None:
+            params['wait_for_completion_timeout'] = '{}ms'.format(int(wait * 1000))
+            # the client must wait longer than elasticsearch holds the request
+            params['request_timeout'] = wait + 10
+        path = _make_path('_async_search', self.id)
+        self._status = self._es.transport.perform_request('GET', path, params=params)
+
+    def __extract(self, status):
+        result = status.get('response', {})
+        for name in self.key.split('.') if self.key else ():
+            result = result.get(name, {})
+        return result
@@ -0,0 +1,234 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Client-side caching and sharing of elasticsearch results."""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from .serializer import Serializer, dumps
+
+_serializer = Serializer()
+
+
+def request_key(cluster, index, operation, params):
+    """Get the key identifying a request.
+
+    Args:
+        cluster (str): Identifier of the cluster
+        index (str): Name of the index
+        operation (str): Name of the client method sending the request
+        params (dict): Parameters of the request including its body
+
+    Returns:
+        str: Digest of the request
+    """
+    params = dict(params)
+    body = params.pop('body', None)
+    parts = (cluster, index, operation, _serializer.dumps(body),
+             dumps(params, sort_keys=True))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """LRU cache for the results of searches, counts and aggregations.
+
+    Entries are evicted once the cache exceeds its byte budget or the
+    entry has outlived its ttl. Entries are invalidated when the refresh
+    and indexing stats of the index they were read from change, so
+    results are never older than the last refresh of the index plus
+    `check_interval` seconds.
+
+    Attributes:
+        max_bytes: Memory budget for cached results
+        ttl: Seconds an entry is valid for
+        check_interval: Seconds between checks of an index's stats
+        stats: Hit-rate and memory metrics
+    """
+
+    def __init__(self, max_bytes=64 * 1024 ** 2, ttl=None, check_interval=1.0):
+        """Init ResultCache.
+
+        Args:
+            max_bytes (int, optional): Memory budget for cached results.
+                Defaults to 64MiB.
+            ttl (float, optional): Seconds an entry is valid for. If None
+                then entries only expire through invalidation or eviction.
+                Defaults to None.
+            check_interval (float, optional): Minimum seconds between checks
+                of whether an index changed. Defaults to 1.0, the default
+                refresh interval of an index.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __repr__(self):
+        return '{}(max_bytes={}, ttl={}, check_interval={})'.format(
+            type(self).__name__, self.max_bytes, self.ttl, self.check_interval
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (self.max_bytes, self.ttl, self.check_interval)
+
+    @property
+    def stats(self):
+        """Hit-rate and memory metrics."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / float(lookups) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def clear(self):
+        """Remove all entries and reset the metrics."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._versions = {}
+            self._bytes = 0
+            self._hits = self._misses = 0
+            self._evictions = self._expirations = self._invalidations = 0
+
+    def fetch(self, key, source, request, version):
+        """Get the result of a request, sending it on a cache miss.
+
+        Args:
+            key (str): Key identifying the request
+            source (tuple): Cluster and index the request reads from
+            request (callable): Sends the request and returns the result
+            version (callable): Returns a token which changes whenever the
+                index is refreshed or written to
+
+        Returns:
+            dict: The result of the request
+        """
+        current = self._version(source, version)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                payload, expires, entry_version = entry
+                if entry_version != current:
+                    self._invalidations += 1
+                    self._bytes -= len(payload)
+                elif expires is not None and expires < time.time():
+                    self._expirations += 1
+                    self._bytes -= len(payload)
+                else:
+                    self._entries[key] = entry  # most recently used
+                    self._hits += 1
+                    return json.loads(payload.decode('utf-8'))
+            self._misses += 1
+        result = request()
+        self._store(key, dumps(result).encode('utf-8'), current)
+        return result
+
+    def _store(self, key, payload, version):
+        if len(payload) > self.max_bytes:
+            return
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (payload, expires, version)
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions += 1
+
+    def _version(self, source, version):
+        """Get the version token of an index, checked at most every interval."""
+        now = time.time()
+        with self._lock:
+            cached = self._versions.get(source)
+        if cached is not None and now - cached[1] < self.check_interval:
+            return cached[0]
+        token = version()
+        with self._lock:
+            self._versions[source] = (token, now)
+        return token
+
+
+class _Call(object):
+    """Request in flight which other callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer(object):
+    """Share a single request between identical requests sent concurrently.
+
+    The first caller sends the request and any caller with the same key
+    arriving before it completes waits for, and receives a copy of, its
+    result instead of sending its own request.
+    """
+
+    def __init__(self):
+        """Init RequestCoalescer."""
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def fetch(self, key, request):
+        """Get the result of a request, sharing any identical one in flight.
+
+        Args:
+            key (str): Key identifying the request
+            request (callable): Sends the request and returns the result
+
+        Returns:
+            dict: The result of the request
+        """
+        with self._lock:
+            call = self._inflight.get(key)
+            if call is None:
+                call = self._inflight[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return deepcopy(call.result)
+        try:
+            call.result = request()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+        # the result is shared with the waiters so each caller gets a copy
+        return deepcopy(call.result) if call.waiters else call.result
@@ -3,30 +3,78 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """Module for managing elasticsearch / bamboo configuration settings."""
 import os
-from collections import MutableMapping
-
-from elasticsearch import Elasticsearch
+import threading
 
+from .serializer import Serializer
 from .utils import dict_to_params
 
-
-def set_connection(func):
-    """Decorate function to recreate elasticsearch connection object."""
-    def wrapper(obj, *args, **kwargs):
-        func(obj, *args, **kwargs)
-        obj.connection = Elasticsearch(**obj)
-    return wrapper
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # python 2
+    from collections import MutableMapping
+
+# clients of this process by connection parameters
+_connections = {}
+_lock = threading.Lock()
+
+
+def _after_fork():
+    """Drop the clients inherited from the parent process."""
+    global _lock
+    _lock = threading.Lock()
+    _connections.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    # sockets of the parent must not be shared by a forked child
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def connect(params):
+    """Get the client of this process for connection parameters.
+
+    Clients are created on first use and shared by every config with the
+    same parameters. A forked process creates its own clients rather than
+    sharing the sockets of its parent.
+
+    Args:
+        params (dict): Arguments of the `Elasticsearch` client. `maxsize`
+            sets the number of pooled connections to each node, and
+            `keep_alive` the seconds a pooled connection may idle before
+            tcp keep-alive probes are sent. `json_library` names the json
+            library of the serializer, see `serializer.JSON_LIBRARIES`,
+            by default the fastest installed.
+
+    Returns:
+        Elasticsearch: Client with a pool of connections
+    """
+    key = (os.getpid(), tuple(sorted((k, repr(v)) for k, v in params.items())))
+    with _lock:
+        client = _connections.get(key)
+        if client is None:
+            from elasticsearch import Elasticsearch
+            from .connection import KeepAliveConnection
+            params = dict(params)
+            library = params.pop('json_library', None)
+            params.setdefault('serializer', Serializer(library))
+            if params.get('keep_alive') is not None:
+                params.setdefault('connection_class', KeepAliveConnection)
+            client = _connections[key] = Elasticsearch(**params)
+        return client
 
 
 class Config(MutableMapping):
-    """Configuration storage class."""
+    """Configuration storage class.
+
+    The client is created when the connection is first used, so any
+    number of changes to the configuration are applied at once.
+    """
 
-    @set_connection
     def __init__(self, **kwargs):
         """Init Config."""
         self.config_files = ('setup.cfg', 'tox.ini', '.bamboo')
-        self.connection = None
         self._config = {}
+        self._connection = None
         self.__search(kwargs)
 
     def __repr__(self):
@@ -35,7 +83,6 @@ class Config(MutableMapping):
             dict_to_params(self._config)
         )
 
-    @set_connection
     def __call__(self, **kwargs):
         """Set connection arguments."""
         self._config.update(kwargs)
@@ -43,9 +90,24 @@ class Config(MutableMapping):
     def __getstate__(self):
         return self._config
 
-    @set_connection
     def __setstate__(self, state):
         self._config = state
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Elasticsearch client for the configuration.
+
+        Configurations with the same parameters share a pooled client,
+        unless a client has been set explicitly.
+        """
+        if self._connection is not None:
+            return self._connection
+        return connect(self._config)
+
+    @connection.setter
+    def connection(self, client):
+        self._connection = client
 
     def __iter__(self):
         return iter(self._config)
@@ -53,14 +115,12 @@ class Config(MutableMapping):
     def __len__(self):
         return len(self._config)
 
-    @set_connection
     def __setitem__(self, key, value):
         self._config[key] = value
 
     def __getitem__(self, key):
         return self._config.get(key)
 
-    @set_connection
     def __delitem__(self, key):
         del self._config[key]
 
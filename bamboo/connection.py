@@ -0,0 +1,30 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Connection classes of the elasticsearch client.
+
+Imported when the first client is created, see `config.connect`.
+"""
+import socket
+
+from elasticsearch.connection import Urllib3HttpConnection
+from urllib3.connection import HTTPConnection
+
+
+class KeepAliveConnection(Urllib3HttpConnection):
+    """Connection whose pooled sockets send tcp keep-alive probes."""
+
+    def __init__(self, keep_alive=None, **kwargs):
+        """Init KeepAliveConnection.
+
+        Args:
+            keep_alive (int, optional): Seconds a socket may idle before
+                keep-alive probes are sent. Defaults to None, the system
+                default.
+            **kwargs (dict): Arguments of Urllib3HttpConnection
+        """
+        super(KeepAliveConnection, self).__init__(**kwargs)
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if keep_alive is not None and hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(keep_alive)))
+        self.pool.conn_kw['socket_options'] = HTTPConnection.default_socket_options + options
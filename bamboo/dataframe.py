@@ -2,16 +2,25 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """Pandas-style framework for interacting with elasticsearch."""
+import itertools
+import json
+import os
+import random
+from collections import defaultdict
 from copy import deepcopy
 
 from six import string_types
 
-from elasticsearch.helpers import scan
-
+from .async_search import AsyncSearch
+from .cache import RequestCoalescer, request_key
 from .config import config
 from .exceptions import BadOperatorError, MissingQueryError
+from .fields import Date, Dummy, Expression, Numeric, _unique
 from .orm import OrmMixin
-from .queries import Bool, Query, Script
+from .partitions import Partitions
+from .queries import Bool, Query, Script, Terms
+from .slices import Slice, load_frame, read_frame
+from .utils import hit_source, nested_to_dot, prefetch, to_columns
 
 
 class DataFrame(OrmMixin):
@@ -20,11 +29,27 @@ class DataFrame(OrmMixin):
     Attributes:
         index: The elasticsearch index name
         config: Configuration object for elasticsearch
+        cache: Cache for the results of counts, searches and aggregations
     """
 
     config = config
+    cache = None
+    _inflight = RequestCoalescer()
+    # deepest page of a search, the index.max_result_window default
+    max_result_window = 10000
+    # field unique to each document breaking ties when paging through sorted hits,
+    # sorting on _id needs its fielddata, deprecated in 7.6 and disabled in 8
+    tiebreaker = '_id'
+    # request options each operation accepts, scrolls reject the request cache
+    _operation_options = {
+        'search': ('request_cache', 'preference', 'routing', 'pre_filter_shard_size'),
+        'count': ('preference', 'routing'),
+        'scan': ('preference', 'routing', 'pre_filter_shard_size'),
+        'get': ('preference', 'routing'),
+        'async_search': ('request_cache', 'preference', 'routing'),
+    }
 
-    def __init__(self, index, frozen=True, config=None):
+    def __init__(self, index, frozen=True, config=None, cache=None):
         """Init DataFrame.
 
         Args:
@@ -34,13 +59,23 @@ class DataFrame(OrmMixin):
             config (config.Config.optional): Configuration object. If none
                 provided then uses mutable config.config in global namespace.
                 Defaults to None.
+            cache (cache.ResultCache, optional): Cache for results. If none
+                provided then uses DataFrame.cache, which by default does
+                not cache. Defaults to None.
         """
         if not frozen:
             raise NotImplementedError
         self.index = index
         self.config = config or self.config
+        self.cache = cache or self.cache
         self._query = None
         self._limit = None
+        self._sort = []
+        self._reversed = False
+        self._sample = None
+        self._options = {}
+        self._runtime = {}
+        self._partitions = None
         self._load_orm()
 
     @property
@@ -115,7 +150,8 @@ class DataFrame(OrmMixin):
         doc = self._es.get(index=self.index,
                            id=id,
                            doc_type='doc',
-                           _source=fields)
+                           _source=fields,
+                           **self.__options('get'))
         return doc['_source']
 
     __call__ = get
@@ -125,16 +161,39 @@ class DataFrame(OrmMixin):
         """List all the indices in the elasticsearch cluster."""
         return cls.config.connection.indices.get('*').keys()
 
-    def query(self, source):
+    def query(self, source=None, params=None, id=None):
         """Set condition according to painless script.
 
         Args:
-            source (str): Parseable expression string
+            source (str, optional): Parseable expression string. Values
+                which vary should be read from `params` so the script is
+                only compiled once. Defaults to None.
+            params (dict, optional): Variables available to the script as
+                `params`. Defaults to None.
+            id (str, optional): Name of a stored script, see
+                `register_script`, used instead of a source. Defaults to None.
 
         Returns:
             query.Script: Script query object.
         """
-        return Script(source)
+        return Script(source, params=params, id=id)
+
+    def register_script(self, name, source):
+        """Store a painless script in the cluster.
+
+        Stored scripts are compiled once and cached by elasticsearch, and
+        can be used in conditions with `query(id=name, params=...)`.
+
+        Args:
+            name (str): Id the script is stored under
+            source (str): Painless script
+        """
+        self._es.put_script(id=name, body={
+            'script': {
+                'lang': 'painless',
+                'source': source
+            }
+        })
 
     def limit(self, n):
         """Limit the number of results returned by elasticsearch.
@@ -149,6 +208,316 @@ class DataFrame(OrmMixin):
         new._limit = n
         return new
 
+    def sort_values(self, by, ascending=True):
+        """Sort documents by the values of fields.
+
+        Documents are sorted by elasticsearch, so combined with `head` only
+        the first documents are read. Documents missing a field are last.
+
+        Args:
+            by (str or List[str]): Field names to sort by
+            ascending (bool or List[bool], optional): Sort ascending vs.
+                descending, one for each field. Defaults to True.
+
+        Returns:
+            DataFrame: DataFrame with sort applied.
+        """
+        by = [by] if isinstance(by, string_types) else list(by)
+        if isinstance(ascending, bool):
+            ascending = [ascending] * len(by)
+        if len(ascending) != len(by):
+            raise ValueError("Length of ascending ({}) != length of by ({})"
+                             .format(len(ascending), len(by)))
+        for name in by:
+            self.__field(name)
+        if self._sample is not None:
+            raise ValueError("Samples are in random order and can not be sorted.")
+        new = deepcopy(self)
+        new._sort = [{name: 'asc' if i else 'desc'} for name, i in zip(by, ascending)]
+        new._reversed = False
+        return new
+
+    def head(self, n=5):
+        """Limit the results to the first `n` documents.
+
+        Args:
+            n (int, optional): The number of results to return. Defaults to 5.
+
+        Returns:
+            DataFrame: DataFrame with limit applied.
+
+        Raises:
+            ValueError: If taking fewer than all documents of a `tail`
+        """
+        if self._limit is not None:
+            if self._reversed and n < self._limit:
+                raise ValueError("The head of a tail is not supported.")
+            n = min(n, self._limit)
+        return self.limit(n)
+
+    def tail(self, n=5):
+        """Limit the results to the last `n` documents in sorted order.
+
+        The sort is reversed in elasticsearch, so only the last documents
+        are read.
+
+        Args:
+            n (int, optional): The number of results to return. Defaults to 5.
+
+        Returns:
+            DataFrame: DataFrame with limit applied.
+
+        Raises:
+            ValueError: If the dataframe is not sorted or is limited other
+                than by `tail`, e.g. `head(10).tail(3)`
+        """
+        if not self._sort:
+            raise ValueError("tail requires a sort, see `sort_values`.")
+        if self._limit is not None:
+            if not self._reversed:
+                raise ValueError("The tail of a limited dataframe is not supported.")
+            return self.limit(min(n, self._limit))
+        new = self.limit(n)
+        new._sort = [{name: 'desc' if order == 'asc' else 'asc'}
+                     for i in self._sort for name, order in i.items()]
+        new._reversed = not self._reversed
+        return new
+
+    def nlargest(self, n, columns):
+        """Limit the results to the `n` documents with the largest values.
+
+        Documents missing the first of the fields are excluded.
+
+        Args:
+            n (int): The number of results to return
+            columns (str or List[str]): Numeric or date fields to order by
+
+        Returns:
+            DataFrame: DataFrame with sort and limit applied.
+        """
+        return self.__nbest(n, columns, ascending=False)
+
+    def nsmallest(self, n, columns):
+        """Limit the results to the `n` documents with the smallest values.
+
+        Documents missing the first of the fields are excluded.
+
+        Args:
+            n (int): The number of results to return
+            columns (str or List[str]): Numeric or date fields to order by
+
+        Returns:
+            DataFrame: DataFrame with sort and limit applied.
+        """
+        return self.__nbest(n, columns, ascending=True)
+
+    def __nbest(self, n, columns, ascending):
+        columns = [columns] if isinstance(columns, string_types) else list(columns)
+        for name in columns:
+            if not isinstance(self.__field(name), (Numeric, Date)):
+                raise TypeError("Field `{}` is not numeric or a date".format(name))
+        new = self[self.__field(columns[0]).exists()]
+        return new.sort_values(columns, ascending).head(n)
+
+    def sample(self, n=None, frac=None, seed=None):
+        """Sample a uniformly random subset of the documents.
+
+        Documents are scored randomly by elasticsearch and the highest
+        scoring are returned, so a sample is read in a single request.
+        Aggregations on a sample run over up to `n` random documents from
+        each shard, which gives fast approximate statistics.
+
+        Args:
+            n (int, optional): Number of documents to sample. Defaults to 1
+                if `frac` is None.
+            frac (float, optional): Fraction of the matching documents to
+                sample. Defaults to None.
+            seed (int, optional): Seed for a repeatable sample. Defaults to
+                None, a different sample each time. Each collection of an
+                unseeded sample is seeded randomly so its pages are
+                scored consistently.
+
+        Returns:
+            DataFrame: DataFrame with sampling applied.
+        """
+        if n is not None and frac is not None:
+            raise ValueError("Please enter a value for `frac` OR `n`, not both.")
+        if n is None and frac is None:
+            n = 1
+        new = deepcopy(self)
+        new._sample = {'n': n, 'frac': frac, 'seed': seed}
+        new._sort = []
+        new._reversed = False
+        return new
+
+    def _sample_size(self, total=None):
+        """Number of documents in the sample.
+
+        Args:
+            total (int, optional): Count of the matching documents, which
+                is requested if needed and not given. Defaults to None.
+        """
+        n = self._sample['n']
+        if n is not None and total is None:
+            return n
+        if total is None:
+            total = self.__unsampled().count()
+        if n is not None:
+            return min(n, total)
+        return int(round(self._sample['frac'] * total))
+
+    def __seeded(self):
+        """Get the sample with a random seed."""
+        new = deepcopy(self)
+        new._sample = dict(self._sample, seed=random.randint(0, 2 ** 31 - 1))
+        return new
+
+    def __unsampled(self):
+        new = deepcopy(self)
+        new._sample = None
+        return new
+
+    def __random_score(self, query):
+        """Score the documents matching a query randomly."""
+        random_score = {}
+        if self._sample['seed'] is not None:
+            random_score = {'seed': self._sample['seed'], 'field': '_seq_no'}
+        return {
+            'function_score': {
+                'query': query,
+                'random_score': random_score,
+                'boost_mode': 'replace'
+            }
+        }
+
+    def store_lookup(self, index, id, values, path='values', doc_type='doc'):
+        """Store a set of terms for use in `isin_lookup` conditions.
+
+        Sets larger than `queries.Terms.max_terms` are stored across
+        several documents, as elasticsearch limits the number of terms
+        read from a single lookup. Documents left over from a larger set
+        previously stored under the same id are deleted.
+
+        Args:
+            index (str): Index to store the terms in. Disabling dynamic
+                mapping on the index avoids indexing the terms.
+            id (str): Id of the document holding the terms
+            values (iterable): Terms to store. Accepts numpy arrays and
+                pandas series.
+            path (str, optional): Field of the document holding the terms.
+                Defaults to `values`.
+            doc_type (str, optional): Mapping type of the documents.
+                Defaults to `doc`.
+
+        Returns:
+            List[str]: Ids of the documents holding the terms
+        """
+        chunks = Terms.chunked(path, _unique(values))
+        ids = [id] if len(chunks) == 1 else ['{}-{}'.format(id, i) for i in range(len(chunks))]
+        for chunk_id, chunk in zip(ids, chunks):
+            doc = chunk.value
+            for name in reversed(path.split('.')):
+                doc = {name: doc}
+            self._es.index(index=index, doc_type=doc_type, id=chunk_id, body=doc)
+        # drop the documents of a previous set stored under the id
+        if len(ids) > 1:
+            self._es.delete(index=index, doc_type=doc_type, id=id, ignore=404)
+        for i in itertools.count(len(ids) if len(ids) > 1 else 0):
+            deleted = self._es.delete(index=index, doc_type=doc_type,
+                                      id='{}-{}'.format(id, i), ignore=404)
+            if deleted.get('result') != 'deleted':
+                break
+        self._es.indices.refresh(index=index)
+        return ids
+
+    def assign(self, **columns):
+        """Add fields computed by elasticsearch from each document.
+
+        The fields are defined as runtime fields, which elasticsearch
+        computes next to the data, and can be used in conditions,
+        aggregations and `collect` like mapped fields. Requires
+        elasticsearch 7.11 or later.
+
+        Args:
+            **columns (Expression or str): Expressions computing each field,
+                e.g. `total=df.price * df.qty`. A string is treated as a
+                painless expression evaluating to a double.
+
+        Returns:
+            DataFrame: DataFrame with the fields added.
+        """
+        new = deepcopy(self)
+        for name, expression in columns.items():
+            if not isinstance(expression, Expression):
+                expression = Expression(expression)
+            new._runtime[name] = {
+                'type': expression.dtype,
+                'script': Script(expression.script, params=expression.params).script
+            }
+            Field = new._type_mapping.get(expression.dtype, Dummy)
+            setattr(new, name, Field(name, new))
+        return new
+
+    def partition_by(self, field, index_format=None):
+        """Skip indices which cannot match the date range of the conditions.
+
+        Elasticsearch is asked to check the minimum and maximum value of
+        the field in every shard before searching it, and skips shards
+        which cannot match date ranges on the field. If the index names
+        follow a date format then indices outside of the date range are
+        not searched at all.
+
+        Args:
+            field (str): Date field the indices are partitioned by
+            index_format (str, optional): strftime format of the index
+                names, e.g. `logs-%Y.%m.%d`. Defaults to None.
+
+        Returns:
+            DataFrame: DataFrame with partitioning applied.
+        """
+        new = deepcopy(self)
+        new._partitions = Partitions(field, index_format)
+        new._options['pre_filter_shard_size'] = 1
+        return new
+
+    @property
+    def _indices(self):
+        """Indices searched for the conditions, pruned by date if partitioned."""
+        if self._partitions is None or self._partitions.index_format is None or not self._query:
+            return self.index
+        indices = self._partitions.indices(self._es, self.index)
+        return ','.join(self._partitions.prune(indices, self._query.optimize()))
+
+    def with_options(self, request_cache=None, preference=None, routing=None):
+        """Set options applied to every request for the dataframe.
+
+        Args:
+            request_cache (bool, optional): Whether elasticsearch should use
+                its shard request cache for searches and aggregations. If
+                None then uses the index setting. Defaults to None.
+            preference (str, optional): Shard copies to execute requests on.
+                A custom string such as a session id routes repeated
+                requests to the same copies, keeping their caches warm.
+                Defaults to None.
+            routing (str, optional): Comma-separated routing values
+                restricting requests to the shards they route to.
+                Defaults to None.
+
+        Returns:
+            DataFrame: DataFrame with options applied.
+        """
+        new = deepcopy(self)
+        options = {'request_cache': request_cache,
+                   'preference': preference,
+                   'routing': routing}
+        new._options.update((k, v) for k, v in options.items() if v is not None)
+        return new
+
+    def __options(self, operation):
+        """Get the request options supported by an operation."""
+        return {k: v for k, v in self._options.items()
+                if k in self._operation_options[operation]}
+
     def filter(self, *conditions):
         """Each condition must appear in matching documents.
 
@@ -168,10 +537,47 @@ class DataFrame(OrmMixin):
 
     @property
     def _body(self):
-        """Raw query sent to elasticsearch."""
+        """Raw query as defined by the conditions."""
+        if not self._query:
+            return self.__request_body({'match_all': {}})
+        return self.__request_body(self._query())
+
+    def _compile(self, scoring=True):
+        """Query sent to elasticsearch.
+
+        The conditions are optimized into an equivalent query which is
+        cheaper for elasticsearch to parse and execute.
+
+        Args:
+            scoring (bool, optional): Whether matching documents need to be
+                scored. If not then the conditions are executed in filter
+                context, which skips scoring and is cached by elasticsearch.
+                Defaults to True.
+        """
         if not self._query:
-            return {'query': {'match_all': {}}}
-        return {'query': self._query()}
+            return self._body
+        query = self._query.optimize()
+        if not scoring:
+            query = query.filter_context()
+        return self.__request_body(query())
+
+    def __request_body(self, query):
+        """Get the body of a request for a query."""
+        if self._sample is not None:
+            query = self.__random_score(query)
+        if not self._runtime:
+            return {'query': query}
+        return {'query': query, 'runtime_mappings': self._runtime}
+
+    @property
+    def _empty(self):
+        """Whether the conditions provably match no documents.
+
+        Such queries are answered without a request to elasticsearch.
+        """
+        if not self._query:
+            return False
+        return self._query.optimize().empty or not self._indices
 
     def execute(self, body, size=None, fields=None,
                 preserve_order=False, **es_kwargs):
@@ -193,22 +599,167 @@ class DataFrame(OrmMixin):
                 if `size` is None.
         """
         if size is None:
+            from elasticsearch.helpers import scan
+            if 'sort' in body:
+                preserve_order = True  # otherwise the scan sorts by _doc
             return scan(
                 client=self._es,
-                index=self.index,
+                index=self._indices,
                 query=body,
                 preserve_order=preserve_order,
                 _source=fields,
-                **es_kwargs
+                **dict(self.__options('scan'), **es_kwargs)
             )
-        return self._es.search(
-            index=self.index,
+        if size > self.max_result_window and 'sort' in body:
+            return self.__search_after(body, size, fields, **es_kwargs)
+        return self._request(
+            'search',
             body=body,
             size=size,
             _source=fields,
             **es_kwargs
         )
 
+    def __search_after(self, body, size, fields, **es_kwargs):
+        """Page through the first hits of a sorted search.
+
+        Pages continue after the sort values of the last hit, with the
+        `tiebreaker` field breaking ties, so no page is deeper than the
+        result window.
+        """
+        body = dict(body, sort=list(body['sort']) + [{self.tiebreaker: 'asc'}])
+        while size > 0:
+            page = min(size, self.max_result_window)
+            hits = self.__page(body, page, fields, **es_kwargs)
+            for hit in hits:
+                yield hit
+            if len(hits) < page:
+                return
+            size -= page
+            body = dict(body, search_after=hits[-1]['sort'])
+
+    def __page(self, body, size, fields, **es_kwargs):
+        """Get a page of hits, bypassing the result cache.
+
+        Pages are read once, so caching them would only evict useful
+        results, and a resumed export must never read a stale page.
+        """
+        params = dict(self.__options('search'), **es_kwargs)
+        return self._es.search(index=self._indices, body=body, size=size,
+                               _source=fields, **params)['hits']['hits']
+
+    def agg(self, aggs, async_search=False, **es_kwargs):
+        """Run aggregations over the matching documents.
+
+        Args:
+            aggs (dict): Aggregations in elasticsearch format, by name
+            async_search (bool, optional): Whether to run the aggregations
+                as an asynchronous search and return its handle instead of
+                waiting for the results. Defaults to False.
+            **es_kwargs (dict, optional): Additional arguments to pass to elasticsearch.
+
+        Returns:
+            dict: Results of the aggregations by name. An AsyncSearch whose
+                result is the aggregations if `async_search` is True.
+        """
+        if async_search:
+            body, path = self.__aggregation(aggs)
+            return self.submit(body, key='.'.join(path), **es_kwargs)
+        return self._aggregate(aggs, **es_kwargs)
+
+    def submit(self, body=None, size=0, key=None, keep_alive='5d', **es_kwargs):
+        """Start a search which runs asynchronously in elasticsearch.
+
+        The search does not hold a connection while it runs. Its results
+        are kept by elasticsearch, so the search can be resumed from its
+        id with `AsyncSearch(id)`, e.g. after a process restart.
+
+        Args:
+            body (dict, optional): Query body in json format. Defaults to
+                the conditions of the dataframe.
+            size (int, optional): The number of documents to return.
+                Defaults to 0.
+            key (str, optional): Dot-separated path of the part of the
+                response the handle returns, e.g. `aggregations`. Defaults
+                to None, the whole response.
+            keep_alive (str, optional): How long elasticsearch keeps the
+                search and its results. Defaults to 5 days.
+            **es_kwargs (dict, optional): Additional arguments to pass to elasticsearch.
+
+        Returns:
+            AsyncSearch: Handle of the search
+        """
+        if body is None:
+            body = self._compile(scoring=False)
+        params = dict(self.__options('async_search'), size=size, **es_kwargs)
+        return AsyncSearch.submit(self._es, self._indices, body,
+                                  key=key,
+                                  config=self.config,
+                                  keep_alive=keep_alive,
+                                  **params)
+
+    def _aggregate(self, aggs, **es_kwargs):
+        """Run aggregations over the matching, or sampled, documents.
+
+        Args:
+            aggs (dict): Aggregations in elasticsearch format
+            **es_kwargs (dict, optional): Additional arguments to pass to elasticsearch.
+
+        Returns:
+            dict: Results of the aggregations by name
+        """
+        body, path = self.__aggregation(aggs)
+        results = self.execute(body, size=0, **es_kwargs)
+        for key in path:
+            results = results[key]
+        return results
+
+    def __aggregation(self, aggs):
+        """Get the body of an aggregation request and the path to its results."""
+        if self._sample is None:
+            return dict(self._compile(scoring=False), aggs=aggs), ['aggregations']
+        aggs = {'sample': {'sampler': {'shard_size': self._sample_size()}, 'aggs': aggs}}
+        return dict(self._compile(scoring=False), aggs=aggs), ['aggregations', 'sample']
+
+    def _request(self, operation, **params):
+        """Send a request for the index, using the result cache if set.
+
+        Identical requests sent concurrently from several threads share a
+        single request to elasticsearch.
+
+        Args:
+            operation (str): Name of the client method sending the request
+            **params (dict): Parameters of the request
+
+        Returns:
+            dict: The response from elasticsearch
+        """
+        request = getattr(self._es, operation)
+        params = dict(self.__options(operation), index=self._indices, **params)
+        cluster = repr(self.config)
+        key = request_key(cluster, self.index, operation, params)
+
+        def send():
+            return self._inflight.fetch(key, lambda: request(**params))
+
+        if self.cache is None:
+            return send()
+        return self.cache.fetch(key,
+                                source=(cluster, self.index),
+                                request=send,
+                                version=self._version)
+
+    def _version(self):
+        """Token which changes whenever the index is refreshed or written to."""
+        stats = self._es.indices.stats(index=self.index, metric='refresh,indexing')
+        return sorted(
+            (name,
+             i['primaries']['refresh']['total'],
+             i['primaries']['indexing']['index_total'],
+             i['primaries']['indexing']['delete_total'])
+            for name, i in stats['indices'].items()
+        )
+
     def collect(self, fields=None, limit=None, preserve_order=False,
                 include_score=False, include_id=False, **es_kwargs):
         """Collect documents according to query conditions.
@@ -235,10 +786,129 @@ class DataFrame(OrmMixin):
         Returns:
             generator: The response from elasticsearch
         """
+        if self._empty:
+            return self.__hits([], include_score, include_id)
+        if self._sample is not None and self._sample['seed'] is None:
+            # pages of the sample must be scored alike, so each collection is seeded
+            return self.__seeded().collect(fields, limit, preserve_order, include_score,
+                                           include_id, **es_kwargs)
         size = limit or self._limit
-        body = dict(self._body, **{'track_scores': include_score})
+        # boosted conditions and ordering by score are explicitly scored
+        scoring = include_score or preserve_order or bool(self._query and self._query.boosted)
+        body = dict(self._compile(scoring), **{'track_scores': include_score})
+        fields = self.__select(body, fields)
+        if self._sort:
+            body['sort'] = self._sort
+        if self._sample is not None:
+            n = self._sample_size()
+            size = n if size is None else min(size, n)
+            # sorting by the random score allows paging past the result window
+            body['sort'] = [{'_score': 'desc'}]
         results = self.execute(body, size, fields, preserve_order, **es_kwargs)
-        return self.__hits(results, include_score, include_id)
+        hits = self.__hits(results, include_score, include_id)
+        if self._reversed:
+            return reversed(list(hits))
+        return hits
+
+    def __select(self, body, fields):
+        """Request the runtime fields among fields, returning the source fields."""
+        if not self._runtime:
+            return fields
+        # runtime fields are not part of the source and are requested separately
+        runtime = [i for i in fields or self._runtime if i in self._runtime]
+        if runtime:
+            body['fields'] = runtime
+        if fields is not None:
+            fields = [i for i in fields if i not in self._runtime] or False
+        return fields
+
+    def export(self, path, fields=None, checkpoint=None, page_size=1000,
+               checkpoint_every=10, **es_kwargs):
+        """Write the matching documents to a file as json lines.
+
+        Documents are read in pages, bypassing the result cache, sorted by
+        the sort of the dataframe and then by the `tiebreaker` field. The
+        default, `_id`, needs fielddata on `_id`, which is deprecated in
+        elasticsearch 7.6 and disabled in 8, so on newer clusters set
+        `tiebreaker` to a field holding a unique keyword per document.
+        If a checkpoint file is given then the position
+        of the export is saved to it every `checkpoint_every` pages. An
+        interrupted export run again with the same checkpoint continues
+        from the last saved position, dropping anything written after it,
+        so no document is written twice or skipped. Documents indexed or
+        updated during the export may or may not be included.
+
+        Args:
+            path (str): File the documents are written to
+            fields (list): The field names that should be returned from source.
+                If None then returns all. Defaults to None.
+            checkpoint (str, optional): File the position of the export is
+                saved to. It is removed once the export completes.
+                Defaults to None.
+            page_size (int, optional): The number of documents read per
+                request. Defaults to 1000.
+            checkpoint_every (int, optional): Pages between checkpoints.
+                Defaults to 10.
+            **es_kwargs (dict, optional): Additional arguments to pass to elasticsearch.
+
+        Returns:
+            int: The number of documents in the file
+        """
+        body = dict(self._compile(scoring=False),
+                    sort=list(self._sort) + [{self.tiebreaker: 'asc'}])
+        fields = self.__select(body, fields)
+        state = {
+            'request': request_key(repr(self.config), self.index, 'export',
+                                   dict(es_kwargs, body=body, _source=fields)),
+            'search_after': None,
+            'count': 0,
+            'offset': 0
+        }
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                saved = json.load(f)
+            if saved['request'] != state['request']:
+                raise ValueError("Checkpoint `{}` is of a different export.".format(checkpoint))
+            state = saved
+        with open(path, 'r+b' if state['offset'] else 'wb') as out:
+            out.seek(state['offset'])
+            out.truncate()
+            pages = [] if self._empty else self.__pages(body, page_size, fields,
+                                                        state['search_after'], **es_kwargs)
+            encode = self._es.transport.serializer.dumps
+            for i, hits in enumerate(pages, 1):
+                state['search_after'] = hits[-1]['sort']
+                state['count'] += len(hits)
+                for doc in self.__hits(hits, False, False):
+                    out.write(encode(doc).encode('utf-8') + b'\n')
+                if checkpoint is not None and i % checkpoint_every == 0:
+                    self.__checkpoint(checkpoint, out, state)
+        if checkpoint is not None and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return state['count']
+
+    def __pages(self, body, size, fields, search_after=None, **es_kwargs):
+        """Page through every hit of a sorted search."""
+        while True:
+            if search_after is not None:
+                body = dict(body, search_after=search_after)
+            hits = self.__page(body, size, fields, **es_kwargs)
+            if hits:
+                yield hits
+            if len(hits) < size:
+                return
+            search_after = hits[-1]['sort']
+
+    @staticmethod
+    def __checkpoint(checkpoint, out, state):
+        """Save the position of an export once its output is on disk."""
+        out.flush()
+        os.fsync(out.fileno())
+        state['offset'] = out.tell()
+        temporary = checkpoint + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        getattr(os, 'replace', os.rename)(temporary, checkpoint)
 
     def count(self):
         """Return the count of documents that match.
@@ -246,7 +916,18 @@ class DataFrame(OrmMixin):
         Returns:
             int: The number of documents
         """
-        results = self._es.count(index=self.index, body=self._body)
+        if self._empty:
+            return 0
+        if self._sample is not None:
+            return self._sample_size(self.__unsampled().count())
+        body = self._compile(scoring=False)
+        if self._runtime or self._partitions is not None:
+            # the count api does not support runtime fields or skipping shards
+            body = dict(body, track_total_hits=True)
+            results = self._request('search', body=body, size=0)
+            total = results['hits']['total']
+            return total['value'] if isinstance(total, dict) else total
+        results = self._request('count', body=body)
         return results['count']
 
     def take(self, n, fields=None):
@@ -265,18 +946,170 @@ class DataFrame(OrmMixin):
         """
         return list(self.collect(fields=fields, limit=n))
 
+    def merge(self, right, on=None, left_on=None, right_on=None,
+              suffixes=('_x', '_y'), batch_size=10000):
+        """Inner join the documents of two dataframes on equal field values.
+
+        The join is pushed down to elasticsearch. The distinct join keys
+        of the smaller dataframe are read a batch at a time, each batch is
+        matched against the larger dataframe with a terms query, and then
+        only the documents of the smaller dataframe whose keys matched are
+        read. The next batch of keys is read while the current one is
+        joined, so at most one batch of matches is held in memory.
+
+        Args:
+            right (DataFrame): DataFrame to join with
+            on (str, optional): Field to join on in both dataframes.
+                Defaults to None.
+            left_on (str, optional): Field to join on in this dataframe.
+                Defaults to `on`.
+            right_on (str, optional): Field to join on in the right
+                dataframe. Defaults to `on`.
+            suffixes (tuple, optional): Suffixes added to fields, other than
+                the join field, in both dataframes. Defaults to ('_x', '_y').
+            batch_size (int, optional): Number of join keys matched at a
+                time. Defaults to 10000.
+
+        Returns:
+            generator: Merged documents with fields in dot-notation
+        """
+        left_on = left_on or on
+        right_on = right_on or on
+        if left_on is None or right_on is None:
+            raise ValueError("Join fields must be set with `on` or `left_on` and `right_on`.")
+        return self.__merge(right, left_on, right_on, suffixes, batch_size)
+
+    def __merge(self, right, left_on, right_on, suffixes, batch_size):
+        swap = right.count() < self.count()
+        small, large = (right, self) if swap else (self, right)
+        small_on, large_on = (right_on, left_on) if swap else (left_on, right_on)
+        for keys in prefetch(small.__distinct(small_on, batch_size)):
+            keys = set(keys)
+            matches = defaultdict(list)
+            for doc in large[large.__field(large_on).isin(keys)].collect():
+                doc = nested_to_dot(doc)
+                for key in self.__keys(doc, large_on) & keys:
+                    matches[key].append(doc)
+            if not matches:
+                continue
+            for doc in small[small.__field(small_on).isin(matches)].collect():
+                doc = nested_to_dot(doc)
+                for key in self.__keys(doc, small_on):
+                    for match in matches.get(key, ()):
+                        left, right = (match, doc) if swap else (doc, match)
+                        yield self.__join(left, right, left_on, right_on, suffixes)
+
+    def __distinct(self, field, size):
+        """Get the distinct values of a field in batches, in sorted order."""
+        if self._empty:
+            return
+        composite = {'size': size, 'sources': [{'key': {'terms': {'field': field}}}]}
+        while True:
+            body = dict(self._compile(scoring=False), aggs={'keys': {'composite': composite}})
+            results = self.execute(body, size=0)['aggregations']['keys']
+            buckets = results['buckets']
+            if buckets:
+                yield [i['key']['key'] for i in buckets]
+            if len(buckets) < size:
+                return
+            composite = dict(composite, after=results.get('after_key', buckets[-1]['key']))
+
+    def __field(self, name):
+        """Get a field from its dot-notation name."""
+        field = self
+        for part in name.split('.'):
+            field = getattr(field, part)
+        return field
+
+    @staticmethod
+    def __keys(doc, field):
+        """Get the set of values of a field in a flattened document."""
+        value = doc.get(field)
+        if value is None:
+            return set()
+        if isinstance(value, list):
+            return set(value)
+        return {value}
+
+    @staticmethod
+    def __join(left, right, left_on, right_on, suffixes):
+        """Merge a left and right document, suffixing shared fields."""
+        same_key = left_on == right_on
+        shared = set(left) & set(right)
+        if same_key:
+            shared.discard(left_on)
+        row = {}
+        for name, value in left.items():
+            row[name + suffixes[0] if name in shared else name] = value
+        for name, value in right.items():
+            if same_key and name == right_on:
+                continue
+            row[name + suffixes[1] if name in shared else name] = value
+        return row
+
     def __hits(self, results, include_score, include_id):
         """Format the raw elasticsearch results to return just source."""
         results = results['hits']['hits'] if isinstance(results, dict) else results
         for hit in results:
-            result = hit['_source']
+            result = hit_source(hit)
             if include_score:
                 result['_score'] = hit.pop('_score')
             if include_id:
                 result['_id'] = hit.pop('_id')
             yield result
 
-    def to_pandas(self, fields=None):
+    def partitions(self, n, fields=None):
+        """Split the matching documents into slices read independently.
+
+        Slices are small and picklable, holding the request for their
+        documents but not the dataframe or its client, so they can be
+        sent to other processes or machines and read in parallel with
+        `Slice.collect` or `Slice.to_pandas`.
+
+        Args:
+            n (int): The number of slices
+            fields (list): The field names that should be returned from source.
+                If None then returns all. Defaults to None.
+
+        Returns:
+            List[Slice]: Slices which together hold each matching document once
+        """
+        if self._limit is not None or self._sample is not None:
+            raise ValueError("Limited or sampled dataframes can not be partitioned.")
+        body = self._compile(scoring=False)
+        fields = self.__select(body, fields)
+        return [Slice(self._indices, body,
+                      id=i,
+                      max=n,
+                      fields=fields,
+                      connection=dict(self.config),
+                      options=self.__options('scan'))
+                for i in range(n)]
+
+    def to_dask(self, npartitions, fields=None):
+        """Collect documents according to query conditions as a dask DataFrame.
+
+        Each partition of the dask DataFrame is a slice of the documents,
+        read by the dask worker computing it.
+
+        Args:
+            npartitions (int): The number of partitions
+            fields (list): The field names that should be returned from source.
+                If None then returns all. Defaults to None.
+
+        Returns:
+            dask.dataframe.DataFrame: The documents with fields in dot-notation
+        """
+        try:
+            import dask
+            import dask.dataframe as dd
+        except ImportError:
+            raise ImportError('Install dask for dask support.')
+        else:
+            parts = [dask.delayed(i.to_pandas)() for i in self.partitions(npartitions, fields)]
+            return dd.from_delayed(parts)
+
+    def to_pandas(self, fields=None, processes=None):
         """Collect documents according to query conditions as a pandas DataFrame.
 
         Args:
@@ -285,6 +1118,11 @@ class DataFrame(OrmMixin):
                 Note: Namespaced fields should be referenced using `.` syntax
                     (`<namespace>.<field>`). They will be returned using the
                     same syntax.
+            processes (int, optional): The number of worker processes. Each
+                reads a slice of the documents with its own client and
+                builds its part of the frame, so decoding is not limited to
+                a single core. Not supported for limited or sampled
+                dataframes. Defaults to None, read in this process.
 
         Returns:
             pd.DataFrame: The response from elasticsearch
@@ -294,21 +1132,31 @@ class DataFrame(OrmMixin):
         except ImportError:
             raise ImportError('Install pandas for pandas support.')
         else:
+            if processes is not None:
+                return self.__parallel_pandas(pd, fields, processes)
             data = self.collect(fields, preserve_order=False)
-            data = (self.__nested_to_dot(i) for i in data)
-            return pd.DataFrame(data)
+            columns, count = to_columns(data)
+            return pd.DataFrame(columns, index=pd.RangeIndex(count))
 
-    @classmethod
-    def __nested_to_dot(cls, hit, namespace=''):
-        """Recursively flattens nested objects to use dot-notation."""
-        d = {}
-        for k, v in hit.items():
-            key = '{}.{}'.format(namespace, k) if namespace else k
-            if isinstance(v, dict):
-                d.update(cls.__nested_to_dot(v, key))
-            else:
-                d[key] = v
-        return d
+    def __parallel_pandas(self, pd, fields, processes):
+        """Build a pandas DataFrame from slices read in worker processes."""
+        import multiprocessing
+        slices = self.partitions(processes, fields)
+        pool = multiprocessing.Pool(processes)
+        try:
+            frames = [load_frame(i) for i in pool.imap(read_frame, slices)]
+        finally:
+            pool.terminate()
+            pool.join()
+        frame = pd.concat(frames, ignore_index=True, sort=False)
+        # slices are read in no particular order, so sort by any collected sort fields
+        keys = [(name, order == 'asc') for i in self._sort for name, order in i.items()
+                if name in frame]
+        if keys:
+            by, ascending = zip(*keys)
+            frame = frame.sort_values(list(by), ascending=list(ascending))
+            frame = frame.reset_index(drop=True)
+        return frame
 
 
 class ElasticDataFrame(DataFrame):
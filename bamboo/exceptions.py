@@ -48,6 +48,22 @@ class MissingQueryError(ValueError):
         super(MissingMappingError, self).__init__(self.msg)
 
 
+class SearchTimeoutError(Exception):
+    """Raise when an asynchronous search does not complete in time."""
+
+    msg = "Search `{}` is still running after {} seconds"
+
+    def __init__(self, id, timeout):
+        """Init SearchTimeoutError.
+
+        Args:
+            id (str): Id of the search
+            timeout (float): Seconds waited for the search
+        """
+        msg = self.msg.format(id, timeout)
+        super(SearchTimeoutError, self).__init__(msg)
+
+
 class BadOperatorError(TypeError):
     """Raise when an inappropriate operator is used.
 
@@ -2,14 +2,31 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """Field and namespace objects representing Elasticsearch field types."""
+import itertools
+import math
+import re
 import warnings
 from abc import ABCMeta
-from copy import deepcopy
+from collections import OrderedDict, namedtuple
+from copy import copy, deepcopy
 from datetime import datetime, timedelta
 from functools import wraps
 
+from six import string_types
+
 from . import queries
 
+DEFAULT_PERCENTS = (1, 5, 25, 50, 75, 95, 99)
+
+Estimate = namedtuple('Estimate', ['value', 'doc_count', 'standard_error'])
+Estimate.__doc__ = """Aggregation estimated from a random sample of documents.
+
+Attributes:
+    value: The aggregation over the sampled documents
+    doc_count: Number of documents sampled
+    standard_error: Standard error of the mean of the sampled values
+"""
+
 
 def check_inversion(func):
     """Decorate a method for invertible operations."""
@@ -120,10 +137,44 @@ class Field(Base):
     def isin(self, values):
         """Condition checking whether multiple terms are in a field's value.
 
+        Values are deduplicated and sorted. Lists longer than
+        `queries.Terms.max_terms` are split into several terms queries,
+        any of which may match.
+
+        Args:
+            values (iterable): Values to check. Accepts numpy arrays and
+                pandas series.
+        """
+        values = _unique(values)
+        if len(values) <= queries.Terms.max_terms:
+            return queries.Terms(self.name, values)
+        return queries.Bool(should=queries.Terms.chunked(self.name, values))
+
+    @check_inversion
+    def isin_lookup(self, index, id, path='values', doc_type=None):
+        """Condition checking whether a field's value is in a stored set of terms.
+
+        The terms are read by elasticsearch from a document, see
+        `DataFrame.store_lookup`, so only its location is sent with
+        each request.
+
         Args:
-            values (list): Sequence of values to check
+            index (str): Index of the document holding the terms
+            id (str or list): Id of the document holding the terms, or the
+                ids of several documents whose terms are combined
+            path (str, optional): Field of the document holding the terms.
+                Defaults to `values`.
+            doc_type (str, optional): Mapping type of the document, required
+                by elasticsearch 6. Defaults to None.
         """
-        return queries.Terms(self.name, values)
+        ids = [id] if isinstance(id, string_types) else list(id)
+        lookup = {'index': index, 'path': path}
+        if doc_type is not None:
+            lookup['type'] = doc_type
+        lookups = [queries.Terms(self.name, dict(lookup, id=i)) for i in ids]
+        if len(lookups) == 1:
+            return lookups[0]
+        return queries.Bool(should=lookups)
 
     def value_counts(self, n=10, normalize=False, missing=None, **es_kwargs):
         """Get the unique value counts for a field.
@@ -193,31 +244,106 @@ class Field(Base):
             warnings.warn("Limits are not applied in aggregations.")
         es_kwargs = params.pop('es_kwargs')
         params = {k: v for k, v in params.items() if v is not None}
-        body = dict(self.root._body, **{
-            'aggs': {
+        if self.root._empty:
+            results = _empty_aggregation(key, params)
+        else:
+            aggs = {
                 key: {
                     key: dict({'field': self.name}, **params)
                 }
             }
-        })
-        results = self.root.execute(body, size=0, **es_kwargs)
-        results = results['aggregations'][key]
+            results = self.root._aggregate(aggs, **es_kwargs)[key]
         if buckets:
             return results.get('buckets', results)
         return results
 
+    def _sampled_aggregation(self, key, sample_size, **params):
+        """Execute an aggregation over a random sample of the matching documents.
+
+        Returns:
+            Estimate: The aggregation results with the sample size and the
+                standard error of the mean.
+        """
+        es_kwargs = params.pop('es_kwargs')
+        params = {k: v for k, v in params.items() if v is not None}
+        root = self.root.sample(sample_size)
+        if root._empty:
+            return Estimate(_empty_aggregation(key, params), 0, None)
+        aggs = {
+            key: {
+                key: dict({'field': self.name}, **params)
+            },
+            'error': {
+                'extended_stats': {'field': self.name}
+            }
+        }
+        results = root._aggregate(aggs, **es_kwargs)
+        stats = results['error']
+        error = None
+        if stats['count'] > 1:
+            error = stats['std_deviation'] / math.sqrt(stats['count'])
+        return Estimate(results[key], results['doc_count'], error)
+
+
+def _unique(values):
+    """Get the sorted unique values of a list, array or series."""
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    try:
+        unique = list(OrderedDict.fromkeys(values))
+    except TypeError:  # unhashable values
+        unique = []
+        for value in values:
+            if value not in unique:
+                unique.append(value)
+    try:
+        return sorted(unique)
+    except TypeError:  # incomparable values
+        return unique
+
+
+def _empty_aggregation(key, params):
+    """Get the result elasticsearch returns for an aggregation without documents."""
+    if key == 'terms':
+        return {'doc_count_error_upper_bound': 0, 'sum_other_doc_count': 0, 'buckets': []}
+    if key == 'histogram':
+        return {'buckets': []}
+    if key == 'cardinality':
+        return {'value': 0}
+    if key == 'sum':
+        return {'value': 0.0}
+    if key in ('stats', 'extended_stats'):
+        stats = {'count': 0, 'min': None, 'max': None, 'avg': None, 'sum': 0.0}
+        if key == 'extended_stats':
+            stats.update(sum_of_squares=None, variance=None, std_deviation=None,
+                         std_deviation_bounds={'upper': None, 'lower': None})
+        return stats
+    if key == 'percentiles':
+        percents = params.get('percents', DEFAULT_PERCENTS)
+        return {'values': [{'key': float(i), 'value': None} for i in percents]}
+    if key == 'percentile_ranks':
+        return {'values': [{'key': float(i), 'value': None} for i in params['values']]}
+    return {'value': None}
+
 
 class AggregationMixin(object):
     """Adds aggregations to a field."""
 
     __metaclass__ = ABCMeta
 
-    def average(self, **es_kwargs):
+    def average(self, sample_size=None, **es_kwargs):
         """Get the average value for a field.
 
+        Args:
+            sample_size (int, optional): Estimate from up to this many random
+                documents from each shard instead of every matching document.
+                Defaults to None.
+
         Returns:
-            float: Average
+            float: Average. An Estimate of the average if `sample_size` is set.
         """
+        if sample_size is not None:
+            result = self._sampled_aggregation('avg', sample_size, es_kwargs=es_kwargs)
+            return result._replace(value=result.value['value'])
         result = self._simple_aggregation('avg', es_kwargs=es_kwargs)
         return result['value']
 
@@ -239,7 +365,7 @@ class AggregationMixin(object):
         result = self._simple_aggregation('min', es_kwargs=es_kwargs)
         return result['value']
 
-    def percentiles(self, missing=None, precision=100, **es_kwargs):
+    def percentiles(self, missing=None, precision=100, sample_size=None, **es_kwargs):
         """Get percentiles for a filed.
 
         Percentiles are calculated over the range of [ 1, 5, 25, 50, 75, 95, 99 ]
@@ -250,6 +376,9 @@ class AggregationMixin(object):
             precision (int, optional): Defines the accuracy - memory tradeoff.
                 Larger precision result in greater accuracy at the cost of
                 greater memory usage and computation time. Defaults to 1000.
+            sample_size (int, optional): Estimate from up to this many random
+                documents from each shard instead of every matching document.
+                Defaults to None.
 
         Notes:
             - Accuracy is proportional to q(1-q). This means that extreme
@@ -263,16 +392,20 @@ class AggregationMixin(object):
 
         Returns:
             List[dict]: List of dicts with `key` as the perecentile range
-                and `value` as the point where that percentile occurs.
+                and `value` as the point where that percentile occurs. An
+                Estimate of the list if `sample_size` is set.
         """
-        result = self._simple_aggregation('percentiles',
-                                          keyed=False,
-                                          tdigest={'compression': precision},
-                                          missing=missing,
-                                          es_kwargs=es_kwargs)
+        params = dict(keyed=False,
+                      tdigest={'compression': precision},
+                      missing=missing,
+                      es_kwargs=es_kwargs)
+        if sample_size is not None:
+            result = self._sampled_aggregation('percentiles', sample_size, **params)
+            return result._replace(value=result.value['values'])
+        result = self._simple_aggregation('percentiles', **params)
         return result['values']
 
-    def describe(self, extended=False, missing=None, **es_kwargs):
+    def describe(self, extended=False, missing=None, sample_size=None, **es_kwargs):
         """Get statistical details for a field.
 
         Args:
@@ -280,14 +413,23 @@ class AggregationMixin(object):
                 Defaults to False.
             missing (num, optional): How documents that are missing a
                 value should be treated. Defaults to ignore.
+            sample_size (int, optional): Estimate from up to this many random
+                documents from each shard instead of every matching document.
+                Defaults to None.
 
         Returns:
             dict: Always returns `count`, `min`, `max`, `average`, `sum`.
                 If `extended` is True then also returns `sum_of_squares`,
                 `variance`, `std_deviation`, and `std_deviation_bounds`.
+                An Estimate of the dict, whose statistics are of the sampled
+                documents, if `sample_size` is set.
 
         """
         key = 'extended_stats' if extended else 'stats'
+        if sample_size is not None:
+            return self._sampled_aggregation(key, sample_size,
+                                             missing=missing,
+                                             es_kwargs=es_kwargs)
         return self._simple_aggregation(key, missing=missing, es_kwargs=es_kwargs)
 
     def histogram(self, interval=50, min_doc_count=1, missing=None, **es_kwargs):
@@ -335,7 +477,135 @@ class RangeMixin(object):
         return queries.Range(self.name).greater_than_or_equal(value)
 
 
-class Numeric(Field, RangeMixin, AggregationMixin):
+class ArithmeticMixin(object):
+    """Adds arithmetic operators building painless expressions."""
+
+    __metaclass__ = ABCMeta
+
+    def _operation(self, operator, other, reverse=False):
+        left, right = Expression.of(self), Expression.of(other)
+        if reverse:
+            left, right = right, left
+        if operator == '/':
+            # avoid integer division
+            left = Expression('(double) ' + left.source, fields=left.fields,
+                              params=left.params)
+        right_source, params = right._rename_params(left.params)
+        return Expression('{} {} {}'.format(left.source, operator, right_source),
+                          fields=left.fields + right.fields, params=params)
+
+    def __add__(self, other):
+        return self._operation('+', other)
+
+    def __radd__(self, other):
+        return self._operation('+', other, reverse=True)
+
+    def __sub__(self, other):
+        return self._operation('-', other)
+
+    def __rsub__(self, other):
+        return self._operation('-', other, reverse=True)
+
+    def __mul__(self, other):
+        return self._operation('*', other)
+
+    def __rmul__(self, other):
+        return self._operation('*', other, reverse=True)
+
+    def __truediv__(self, other):
+        return self._operation('/', other)
+
+    def __rtruediv__(self, other):
+        return self._operation('/', other, reverse=True)
+
+    __div__, __rdiv__ = __truediv__, __rtruediv__
+
+    def __neg__(self):
+        return self._operation('*', -1)
+
+
+class Expression(ArithmeticMixin):
+    """Painless expression computing a value from the fields of a document.
+
+    Expressions are built with arithmetic on numeric fields, e.g.
+    `df.price * df.qty`, and are used to define runtime fields with
+    `DataFrame.assign`. Constants are passed as params, e.g. `df.price * 2`
+    reads `params.p0`, so expressions differing only in their constants
+    share a compiled script.
+
+    Attributes:
+        source: Painless expression evaluating to the value
+        dtype: Runtime field type of the value
+        fields: Names of the fields the expression reads
+        params: Variables the expression reads from `params`
+    """
+
+    def __init__(self, source, dtype='double', fields=(), params=None):
+        """Init Expression.
+
+        Args:
+            source (str): Painless expression evaluating to the value
+            dtype (str, optional): Runtime field type of the value, one of
+                `boolean`, `date`, `double`, `keyword` or `long`.
+                Defaults to `double`.
+            fields (tuple, optional): Names of the fields the expression
+                reads. Documents missing any of them have no value.
+                Defaults to ().
+            params (dict, optional): Variables the expression reads from
+                `params`. Defaults to None.
+        """
+        self.source = source
+        self.dtype = dtype
+        self.fields = tuple(fields)
+        self.params = dict(params or {})
+
+    def __repr__(self):
+        return 'Expression({})'.format(self.source)
+
+    @classmethod
+    def of(cls, value):
+        """Get the expression for a field, expression or constant."""
+        if isinstance(value, Expression):
+            return cls('({})'.format(value.source), fields=value.fields, params=value.params)
+        if isinstance(value, Field):
+            return cls("doc['{}'].value".format(value.name), fields=(value.name,))
+        return cls('params.p0', params={'p0': value})
+
+    def _rename_params(self, taken):
+        """Rename the params of the expression which are taken by another.
+
+        Args:
+            taken (dict): Params of the other expression
+
+        Returns:
+            tuple: Source of the expression with the params renamed and the
+                params of both expressions
+        """
+        source, params = self.source, dict(taken)
+        for name, value in sorted(self.params.items()):
+            if name in params:
+                new = next('p{}'.format(i) for i in itertools.count()
+                           if 'p{}'.format(i) not in params
+                           and 'p{}'.format(i) not in self.params)
+                source = re.sub(r'\bparams\.{}\b'.format(re.escape(name)),
+                                'params.' + new, source)
+                name = new
+            params[name] = value
+        return source, params
+
+    @property
+    def script(self):
+        """Painless script emitting the value of a runtime field."""
+        casts = {'double': '(double) ', 'long': '(long) '}
+        emit = 'emit({}({}));'.format(casts.get(self.dtype, ''), self.source)
+        if not self.fields:
+            return emit
+        exists = ' && '.join("doc['{}'].size() != 0".format(i)
+                             for i in sorted(set(self.fields)))
+        return 'if ({}) {{ {} }}'.format(exists, emit)
+
+
+class Numeric(Field, RangeMixin, AggregationMixin, ArithmeticMixin):
     """Numeric base for conditions and aggregations."""
 
     __metaclass__ = ABCMeta
@@ -499,34 +769,96 @@ class Date(Field, RangeMixin, AggregationMixin):
     dtype = 'date'
 
     class Age(Field, RangeMixin):
-        """Delta from datetime field dtype."""
+        """Delta in days from now for a datetime field dtype.
 
-        dtype = 'age'
+        Ages are compiled to date math relative to `now` rounded to
+        `rounding`, e.g. `now-30d/d`. A rounded value is the same for
+        every request within the rounding period, which allows
+        elasticsearch to reuse results from its request cache.
 
-        def age_to_dt(func):
-            """Decorate a method to supply delta from today as date."""
-            @wraps(func)
-            def wrapper(obj, value):
-                delta = datetime.today() - timedelta(value)
-                return func(obj, delta)
-            return wrapper
-
-        __eq__ = age_to_dt(Field.__eq__)
-        __ne__ = age_to_dt(Field.__ne__)
-        __lt__ = age_to_dt(RangeMixin.__gt__)
-        __le__ = age_to_dt(RangeMixin.__ge__)
-        __gt__ = age_to_dt(RangeMixin.__lt__)
-        __ge__ = age_to_dt(RangeMixin.__le__)
+        Attributes:
+            rounding: Date math unit ages are rounded to, or None to not round
+            time_zone: Time zone used for rounding, defaults to UTC
+        """
+
+        dtype = 'age'
+        rounding = 'd'
+        time_zone = None
+
+        def round(self, rounding='d', time_zone=None):
+            """Set the rounding of ages compared to the field.
+
+            Args:
+                rounding (str, optional): Date math unit to round to, one of
+                    `y`, `M`, `w`, `d`, `h`, `m` or `s`. If None then ages are
+                    not rounded. Defaults to `d`.
+                time_zone (str, optional): UTC offset or IANA time zone used
+                    for rounding, e.g. `+01:00` or `Europe/Paris`. If None
+                    then rounds in UTC. Defaults to None.
+
+            Returns:
+                Age: Age with the rounding applied
+            """
+            new = copy(self)
+            new.rounding = rounding
+            new.time_zone = time_zone
+            return new
+
+        def _date_math(self, value):
+            """Convert an age in days to date math relative to now."""
+            if value == int(value):
+                delta = '{:+d}d'.format(-int(value))
+            else:
+                delta = '{:+d}s'.format(-int(round(value * 86400)))
+            if self.rounding is None:
+                return 'now' + delta
+            return 'now{}/{}'.format(delta, self.rounding)
+
+        def _range(self):
+            return queries.Range(self.name, time_zone=self.time_zone)
+
+        @check_inversion
+        def __eq__(self, value):
+            date = self._date_math(value)
+            return self._range().greater_than_or_equal(date).less_than_or_equal(date)
+
+        def __ne__(self, value):
+            date = self._date_math(value)
+            condition = self._range().greater_than_or_equal(date).less_than_or_equal(date)
+            if self._inverted:
+                return condition
+            return queries.Bool(must_not=condition)
+
+        @check_inversion
+        def __lt__(self, value):
+            return self._range().greater_than(self._date_math(value))
+
+        @check_inversion
+        def __le__(self, value):
+            return self._range().greater_than_or_equal(self._date_math(value))
+
+        @check_inversion
+        def __gt__(self, value):
+            return self._range().less_than(self._date_math(value))
+
+        @check_inversion
+        def __ge__(self, value):
+            return self._range().less_than_or_equal(self._date_math(value))
 
     @property
     def age(self):
-        """Condition treating the value being compared as delta since today."""
+        """Condition treating the value being compared as days since now."""
         return self.Age(self.name, None)
 
     def _epoch_to_dt(func):
         @wraps(func)
         def wrapper(obj, *args, **kwargs):
             result = func(obj, *args, **kwargs)
+            if isinstance(result, Estimate):
+                error = result.standard_error
+                return result._replace(
+                    value=result.value and datetime.fromtimestamp(result.value / 1000),
+                    standard_error=error and timedelta(milliseconds=error))
             if result:
                 return datetime.fromtimestamp(result / 1000)
         return wrapper
@@ -5,6 +5,7 @@
 
 Works with dynamic and static mappings.
 """
+import warnings
 from abc import ABCMeta
 from collections import defaultdict
 
@@ -24,7 +25,9 @@ class OrmMixin(object):
     __metaclass__ = ABCMeta
     _type_mapping = {
         'integer': fields.Integer,
+        'long': fields.Integer,
         'float': fields.Float,
+        'double': fields.Float,
         'scaled_float': fields.Decimal,
         'keyword': fields.String,
         'text': fields.String,
@@ -77,17 +80,65 @@ class OrmMixin(object):
         """
         return getattr(self, key)
 
+    @property
+    def mapping_conflicts(self):
+        """Fields whose type differs between the indices of the dataframe.
+
+        Returns:
+            dict: Types of each conflicting field by index. Conflicting
+                fields are loaded as Dummy fields.
+        """
+        return self._conflicts
+
     def _load_orm(self):
-        """Map elasticsearch index fields to attributes."""
+        """Map elasticsearch index fields to attributes.
+
+        The mappings of all indices matching the index name, alias or
+        pattern are merged.
+        """
         raw = self._es.indices.get_mapping(index=self.index,
                                            include_type_name=False)
-        _, raw = raw.popitem()
-        properties = raw['mappings'].get('properties')
+        properties = {}
+        types = defaultdict(dict)
+        for index, mapping in sorted(raw.items()):
+            self.__merge_properties(properties,
+                                    mapping['mappings'].get('properties', {}),
+                                    index,
+                                    types)
+        self._conflicts = {}
+        for name, by_index in types.items():
+            if len(set(self.__field_class(i) for i in by_index.values())) > 1:
+                self._conflicts[name] = by_index
+        if self._conflicts:
+            warnings.warn("Fields have conflicting types across indices and are "
+                          "loaded as Dummy fields: {}".format(sorted(self._conflicts)))
         if properties:
             self.__parse_properties(properties)
             return properties
         raise MissingMappingError(self.index)
 
+    def __merge_properties(self, merged, properties, index, types, namespace=''):
+        """Recursively merge the properties of an index into merged properties."""
+        for name, definition in properties.items():
+            target = merged.setdefault(name, {})
+            if 'type' in definition:
+                dtype = definition['type']
+                types[namespace + name][index] = dtype
+                if 'type' not in target:
+                    target['type'] = dtype
+                elif self.__field_class(target['type']) is not self.__field_class(dtype):
+                    target['type'] = 'conflict'
+            if 'properties' in definition:
+                self.__merge_properties(target.setdefault('properties', {}),
+                                        definition['properties'],
+                                        index,
+                                        types,
+                                        namespace + name + '.')
+
+    @classmethod
+    def __field_class(cls, dtype):
+        return cls._type_mapping.get(dtype, fields.Dummy)
+
     def __parse_properties(self, properties, namespace=None):
         """Recursively create obj attributes from index properties."""
         for name, definition in properties.items():
@@ -111,7 +162,7 @@ class OrmMixin(object):
 
     def __add_field(self, name, dtype, namespace):
         """Create a field and adds it as an object attribute."""
-        Field = self._type_mapping.get(dtype, fields.Dummy)
+        Field = self.__field_class(dtype)
         if namespace is not None:
             f = Field(name, namespace)
             setattr(namespace, name, f)
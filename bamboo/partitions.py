@@ -0,0 +1,211 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Pruning of time-partitioned indices by the date range of a query."""
+import re
+import time
+from datetime import date, datetime, timedelta
+
+import six
+
+from .queries import Bool, Range
+
+_UNITS = {
+    'y': timedelta(days=366),
+    'M': timedelta(days=31),
+    'w': timedelta(weeks=1),
+    'd': timedelta(days=1),
+    'h': timedelta(hours=1),
+    'H': timedelta(hours=1),
+    'm': timedelta(minutes=1),
+    's': timedelta(seconds=1),
+}
+# smallest strftime directive in an index name to the time an index covers
+_PERIODS = (
+    (('%H',), timedelta(hours=1)),
+    (('%d', '%j'), timedelta(days=1)),
+    (('%U', '%W'), timedelta(weeks=1)),
+    (('%m', '%b', '%B'), timedelta(days=31)),
+    (('%Y', '%y'), timedelta(days=366)),
+)
+_DATE_MATH = re.compile(r'^(?:now|(.+)\|\|)((?:[+-]\d+[yMwdhHms])*)(?:/([yMwdhHms]))?$')
+_OFFSET = re.compile(r'([+-])(\d+)([yMwdhHms])')
+_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+            '%Y-%m-%dT%H:%M', '%Y-%m-%d', '%Y-%m', '%Y')
+# covers time zones, which are at most 14 hours from UTC
+_SLACK = timedelta(days=1)
+
+
+class Partitions(object):
+    """Indices partitioned by a date field.
+
+    Attributes:
+        field: Date field the indices are partitioned by
+        index_format: Format of the index names, e.g. `logs-%Y.%m.%d`
+        period: Time covered by each index
+        refresh_interval: Seconds the list of indices is reused for
+    """
+
+    def __init__(self, field, index_format=None, refresh_interval=1.0):
+        """Init Partitions.
+
+        Args:
+            field (str): Date field the indices are partitioned by
+            index_format (str, optional): strftime format of the index
+                names, e.g. `logs-%Y.%m.%d`. Each index holds the documents
+                from the date in its name until the next one. If None then
+                indices are not pruned client-side. Defaults to None.
+            refresh_interval (float, optional): Seconds the list of indices
+                is reused for. Defaults to 1.0.
+        """
+        self.field = field
+        self.index_format = index_format
+        self.refresh_interval = refresh_interval
+        self.period = None
+        if index_format is not None:
+            self.period = next((period for directives, period in _PERIODS
+                                if any(i in index_format for i in directives)), None)
+            if self.period is None:
+                raise ValueError("Index format has no date: {}".format(index_format))
+        self._listed = {}
+
+    def __repr__(self):
+        return '{}(field={}, index_format={})'.format(
+            type(self).__name__, self.field, self.index_format
+        )
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def indices(self, es, index):
+        """Get the concrete indices of an index pattern or alias.
+
+        Args:
+            es (Elasticsearch): Client for the cluster
+            index (str): Index name, alias or pattern
+
+        Returns:
+            List[str]: Sorted names of the indices
+        """
+        listed = self._listed.get(index)
+        if listed is not None and time.time() - listed[1] < self.refresh_interval:
+            return listed[0]
+        from elasticsearch.exceptions import NotFoundError
+        try:
+            indices = sorted(es.indices.get_alias(index=index))
+        except NotFoundError:
+            indices = []
+        self._listed[index] = (indices, time.time())
+        return indices
+
+    def prune(self, indices, query):
+        """Drop the indices which cannot hold documents matching a query.
+
+        Indices whose names do not match the index format are kept.
+
+        Args:
+            indices (List[str]): Names of the indices
+            query (Query): Conditions of the request
+
+        Returns:
+            List[str]: Names of the indices which may match
+        """
+        lower, upper = bounds(query, self.field)
+        if self.index_format is None or (lower is None and upper is None):
+            return indices
+        kept = []
+        for index in indices:
+            try:
+                start = datetime.strptime(index, self.index_format)
+            except ValueError:
+                kept.append(index)
+                continue
+            if ((upper is None or start <= upper)
+                    and (lower is None or start + self.period > lower)):
+                kept.append(index)
+        return kept
+
+
+def bounds(query, field):
+    """Get the widest date range a query could match on a field.
+
+    Only ranges on the field which every matching document satisfies are
+    considered. Bounds are widened to allow for time zones and date
+    rounding, so they never exclude a matching date.
+
+    Args:
+        query (Query): Conditions of the request
+        field (str): Date field
+
+    Returns:
+        tuple: Lower and upper bound as naive UTC datetimes, either is None
+            if the range is unbounded on that side.
+    """
+    if isinstance(query, Bool):
+        clauses = query.must + query.filter
+    else:
+        clauses = [query]
+    lower = upper = None
+    for clause in clauses:
+        if type(clause) is not Range or clause.field != field:
+            continue
+        for op, value in clause._operators.items():
+            parsed = _to_datetime(value)
+            if parsed is None:
+                continue
+            value, slack = parsed
+            if op in ('gt', 'gte'):
+                value = value - slack
+                lower = value if lower is None else max(lower, value)
+            else:
+                value = value + slack
+                upper = value if upper is None else min(upper, value)
+    return lower, upper
+
+
+def _to_datetime(value):
+    """Convert a range value to a naive UTC datetime and its uncertainty.
+
+    Returns:
+        tuple: Datetime and slack. None if the value could not be parsed.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return value, _SLACK
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day), _SLACK
+    if isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool):
+        return datetime(1970, 1, 1) + timedelta(milliseconds=value), timedelta(0)
+    if not isinstance(value, six.string_types):
+        return None
+    match = _DATE_MATH.match(value)
+    if match is None:
+        return _parse(value)
+    anchor, offsets, rounding = match.groups()
+    if anchor is None:
+        parsed = datetime.utcnow(), _SLACK
+    else:
+        parsed = _parse(anchor)
+        if parsed is None:
+            return None
+    value, slack = parsed
+    for sign, amount, unit in _OFFSET.findall(offsets):
+        delta = _UNITS[unit] * int(amount)
+        value = value + delta if sign == '+' else value - delta
+        if unit in 'yM':  # months and years vary in length
+            slack += timedelta(days=3) * int(amount)
+    if rounding is not None:
+        slack += _UNITS[rounding]
+    return value, slack
+
+
+def _parse(value):
+    """Parse a formatted date."""
+    value = re.sub(r'(Z|[+-]\d\d:?\d\d)$', '', value)
+    for date_format in _FORMATS:
+        try:
+            return datetime.strptime(value, date_format), _SLACK
+        except ValueError:
+            pass
+    return None
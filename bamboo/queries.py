@@ -2,10 +2,14 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """Classes representing elasticsearch queries."""
+import hashlib
+import weakref
 from abc import ABCMeta, abstractproperty
-from collections import defaultdict
-from copy import deepcopy
+from collections import Counter, OrderedDict, defaultdict
 
+import six
+
+from .serializer import Compiled, dumps
 from .utils import dict_to_params
 
 
@@ -23,16 +27,73 @@ def boost(query, value):
     return query.boost(value)
 
 
+class QueryMeta(ABCMeta):
+    """Metaclass interning queries.
+
+    Structurally equal queries are represented by the same object, so
+    identical subtrees are shared rather than allocated again.
+    """
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args, **kwargs):
+        query = super(QueryMeta, cls).__call__(*args, **kwargs)
+        return query._intern()
+
+
+def _freeze(value):
+    """Convert a value to a hashable equivalent for structural comparison.
+
+    The type is kept alongside scalars so that, e.g., `1`, `1.0` and
+    `True` are not considered the same condition.
+    """
+    if isinstance(value, dict):
+        return dict, tuple(sorted(((k, _freeze(v)) for k, v in value.items()),
+                                  key=lambda i: str(i[0])))
+    if isinstance(value, (list, tuple)):
+        kind = _scalar_type(value)
+        if kind is not None:  # fast path for long lists of terms
+            return list, kind, tuple(value)
+        return list, tuple(_freeze(i) for i in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset, frozenset(_freeze(i) for i in value)
+    try:
+        hash(value)
+    except TypeError:
+        return type(value), id(value)
+    return type(value), value
+
+
+_SCALARS = frozenset(six.integer_types + six.string_types + (float, bool, type(None)))
+
+
+def _scalar_type(values):
+    """Get the type shared by a list of scalars, None if there is none."""
+    kinds = set(map(type, values))
+    if len(kinds) == 1 and kinds <= _SCALARS:
+        return kinds.pop()
+    return None
+
+
+@six.add_metaclass(QueryMeta)
 class Query(object):
     """Base class for other query types.
 
+    Queries are immutable. Operations on a query return a new query and
+    the body formatted for elasticsearch is compiled only once. Queries
+    compare and hash by structure.
+
     Attributes:
         field: Field the query is conditioned upon
         value: Value the condition is applying
         body: Query body formatted for elasticsearch
+        fingerprint: Digest of the query structure stable across processes
     """
 
-    __metaclass__ = ABCMeta
+    __slots__ = ('field', 'value', '_boost', '_compiled', '_hash',
+                 '_fingerprint', '_optimized', '_filtered', '__weakref__')
+    _memoized = ('_compiled', '_hash', '_fingerprint', '_optimized',
+                 '_filtered', '__weakref__')
 
     def __init__(self, field, value, boost=None):
         """Init Query.
@@ -43,9 +104,87 @@ class Query(object):
             boost (float, optional): Weight given to this query.
                 Default None.
         """
-        self.field = field
-        self.value = value
-        self._boost = boost
+        self._set(field=field, value=value, _boost=boost)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __getstate__(self):
+        return {name: getattr(self, name)
+                for name in self._attributes()
+                if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        self._set(**state)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(self) is not type(other):
+            return NotImplemented
+        return hash(self) == hash(other) and self._structure == other._structure
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._set(_hash=hash((type(self), self._structure)))
+            return self._hash
+
+    @property
+    def _structure(self):
+        """Hashable representation of the query used for comparison."""
+        return self.field, _freeze(self.value), self._boost
+
+    @property
+    def fingerprint(self):
+        """Digest of the query structure.
+
+        Unlike `hash` it is stable across processes and sessions which
+        makes it suitable as a cache key.
+        """
+        try:
+            return self._fingerprint
+        except AttributeError:
+            raw = dumps(self(), sort_keys=True).encode('utf-8')
+            self._set(_fingerprint=hashlib.sha1(raw).hexdigest())
+            return self._fingerprint
+
+    @classmethod
+    def _attributes(cls):
+        """Names of the attributes defining a query."""
+        return [name
+                for klass in reversed(cls.__mro__)
+                for name in getattr(klass, '__slots__', ())
+                if name not in cls._memoized]
+
+    def _set(self, **attrs):
+        """Set attributes while initializing the query."""
+        for name, value in attrs.items():
+            object.__setattr__(self, name, value)
+
+    def _replace(self, **attrs):
+        """Return a copy of the query with the attributes replaced."""
+        new = object.__new__(type(self))
+        new.__setstate__(dict(self.__getstate__(), **attrs))
+        return new._intern()
+
+    def _intern(self):
+        """Return the existing query structurally equal to this one."""
+        return QueryMeta._interned.setdefault((type(self), self._structure), self)
 
     @abstractproperty
     def key(self):
@@ -76,10 +215,17 @@ class Query(object):
         return Bool(must_not=self)
 
     def __call__(self):
-        """Return the query body formatted for elasticsearch."""
-        if self._boost is not None:
-            return self._boosted_query
-        return self._query
+        """Return the query body formatted for elasticsearch.
+
+        The body is compiled on first call and memoized afterwards. It is
+        read-only since it is shared by every query containing this one.
+        """
+        try:
+            return self._compiled
+        except AttributeError:
+            body = self._query if self._boost is None else self._boosted_query
+            self._set(_compiled=Compiled(body))
+            return self._compiled
 
     @property
     def _query(self):
@@ -106,9 +252,43 @@ class Query(object):
         Returns:
             Query: Query with boost applied.
         """
-        new = deepcopy(self)
-        new._boost = value
-        return new
+        return self._replace(_boost=value)
+
+    @property
+    def boosted(self):
+        """Whether a boost has been applied to the query."""
+        return self._boost is not None
+
+    @property
+    def empty(self):
+        """Whether the query provably matches no documents."""
+        return False
+
+    def optimize(self):
+        """Return an equivalent query which is cheaper to execute.
+
+        Returns:
+            Query: Optimized query.
+        """
+        return self
+
+    def filter_context(self):
+        """Return a query matching the same documents without scoring them.
+
+        Queries in filter context skip scoring and are cached by
+        elasticsearch, which is preferable whenever scores are unused.
+
+        Returns:
+            Query: Query in filter context.
+        """
+        try:
+            return self._filtered
+        except AttributeError:
+            self._set(_filtered=self._filter_context())
+            return self._filtered
+
+    def _filter_context(self):
+        return Bool(filter=self)
 
 
 class Term(Query):
@@ -117,6 +297,7 @@ class Term(Query):
     The field is not analyzed.
     """
 
+    __slots__ = ()
     key = 'term'
 
 
@@ -126,7 +307,10 @@ class Terms(Query):
     The field is not analyzed.
     """
 
+    __slots__ = ()
     key = 'terms'
+    # elasticsearch's default index.max_terms_count
+    max_terms = 65536
 
     def __init__(self, field, value, boost=None):
         """Init Terms.
@@ -139,6 +323,31 @@ class Terms(Query):
         """
         super(Terms, self).__init__(field, value, boost)
 
+    @classmethod
+    def chunked(cls, field, values):
+        """Split terms into queries of at most `max_terms` values each.
+
+        Elasticsearch rejects terms queries with more values than the
+        index's max_terms_count.
+
+        Args:
+            field (str): Field the queries are conditioned upon
+            values (list): List of terms to match
+
+        Returns:
+            List[Terms]: Queries matching the terms between them, a single
+                query matching nothing if there are no terms
+        """
+        if not values:
+            return [cls(field, [])]
+        size = cls.max_terms
+        return [cls(field, values[i:i + size]) for i in range(0, len(values), size)]
+
+    @property
+    def empty(self):
+        """Whether the query provably matches no documents."""
+        return isinstance(self.value, (list, tuple)) and not self.value
+
     @property
     def _boosted_query(self):
         return {
@@ -152,6 +361,7 @@ class Terms(Query):
 class Regexp(Query):
     """Find documents that contain terms matching a regular expression."""
 
+    __slots__ = ()
     key = 'regexp'
 
 
@@ -168,12 +378,14 @@ class Wildcard(Query):
     should not start with one of the wildcards * or ?.
     """
 
+    __slots__ = ()
     key = 'wildcard'
 
 
 class Prefix(Query):
     """Find documents that contain a specific prefix in a provided field."""
 
+    __slots__ = ()
     key = 'prefix'
 
 
@@ -183,6 +395,7 @@ class Match(Query):
     The provided text is analyzed before matching.
     """
 
+    __slots__ = ()
     key = 'match'
 
     @property
@@ -200,6 +413,7 @@ class Match(Query):
 class Exists(Query):
     """Find documents that contain an indexed value for a field."""
 
+    __slots__ = ()
     key = 'exists'
 
     def __init__(self, field, boost=None):
@@ -228,20 +442,22 @@ class Exists(Query):
 class Range(Query):
     """Find documents that contain terms within a provided range."""
 
+    __slots__ = ('_operators', '_time_zone')
     key = 'range'
     _validation_msg = "At least one operation must be called."
 
-    def __init__(self, field, boost=None):
+    def __init__(self, field, boost=None, time_zone=None):
         """Init Query.
 
         Args:
             field (str): Field the query is conditioned upon
             boost (float, optional): Weight given to this query.
                 Default None.
+            time_zone (str, optional): UTC offset or IANA time zone used to
+                convert dates and round date math, e.g. `+01:00` or
+                `Europe/Paris`. Default None.
         """
-        self.field = field
-        self._boost = boost
-        self._operators = {}
+        self._set(field=field, _boost=boost, _operators={}, _time_zone=time_zone)
 
     def greater_than(self, value):
         """Apply greater than operator to value.
@@ -249,9 +465,7 @@ class Range(Query):
         Returns:
             Range: Range query with greater than value applied.
         """
-        new = deepcopy(self)
-        new._operators['gt'] = value
-        return new
+        return self._replace(_operators=dict(self._operators, gt=value))
 
     def greater_than_or_equal(self, value):
         """Apply greater than or equal operator to value.
@@ -259,9 +473,7 @@ class Range(Query):
         Returns:
             Range: Range query with greater than or equal value applied.
         """
-        new = deepcopy(self)
-        new._operators['gte'] = value
-        return new
+        return self._replace(_operators=dict(self._operators, gte=value))
 
     def less_than(self, value):
         """Apply less than operator to value.
@@ -269,9 +481,7 @@ class Range(Query):
         Returns:
             Range: Range query with less than value applied.
         """
-        new = deepcopy(self)
-        new._operators['lt'] = value
-        return new
+        return self._replace(_operators=dict(self._operators, lt=value))
 
     def less_than_or_equal(self, value):
         """Apply less than or equal operator to value.
@@ -279,33 +489,63 @@ class Range(Query):
         Returns:
             Range: Range query with less than or equal value applied.
         """
-        new = deepcopy(self)
-        new._operators['lte'] = value
-        return new
+        return self._replace(_operators=dict(self._operators, lte=value))
 
     @property
-    def _query(self):
+    def _structure(self):
+        return self.field, _freeze(self._operators), self._time_zone, self._boost
+
+    @property
+    def empty(self):
+        """Whether the query provably matches no documents."""
+        lower, upper = self.__bound(('gt', 'gte')), self.__bound(('lt', 'lte'))
+        if not (lower and upper) or not _comparable(lower[1], upper[1]):
+            return False
+        if lower[1] == upper[1]:
+            return 'gt' in self._operators or 'lt' in self._operators
+        return lower[1] > upper[1]
+
+    def __bound(self, ops):
+        """Get the (operator, value) for one side of the range.
+
+        Returns False if both an exclusive and inclusive operator are set.
+        """
+        bound = [(op, self._operators[op]) for op in ops if op in self._operators]
+        if len(bound) > 1:
+            return False
+        return bound[0] if bound else None
+
+    @property
+    def _range(self):
         assert self._operators, self._validation_msg
+        if self._time_zone is None:
+            return self._operators
+        return dict(self._operators, time_zone=self._time_zone)
+
+    @property
+    def _query(self):
         return {
             self.key: {
-                self.field: self._operators
+                self.field: self._range
             }
         }
 
     @property
     def _boosted_query(self):
-        assert self._operators, self._validation_msg
         return {
             self.key: {
-                self.field: dict(self._operators, **{'boost': self._boost})
+                self.field: dict(self._range, **{'boost': self._boost})
             }
         }
 
     def __repr__(self):
+        params = dict(self._operators)
+        if self._time_zone is not None:
+            params['time_zone'] = self._time_zone
         return 'Range(field={}, boost={}, {})'.format(
             self.field,
             self._boost,
-            dict_to_params(self._operators),
+            dict_to_params(params),
         )
 
 
@@ -316,7 +556,9 @@ class Bool(Query):
         body: Query body formatted for elasticsearch
     """
 
+    __slots__ = ('params',)
     key = 'bool'
+    _params = ('must', 'filter', 'should', 'must_not')
     _validation_msg = 'At least one initialization parameter must be supplied.'
 
     def __init__(self, must=None, filter=None, must_not=None, should=None, boost=None):
@@ -341,46 +583,51 @@ class Bool(Query):
             boost (float, optional): Weight given to this query.
                 Default None.
         """
-        self.params = dict(
-            must=must or [],
-            filter=filter or [],
-            should=should or [],
-            must_not=must_not or []
+        params = dict(must=must, filter=filter, should=should, must_not=must_not)
+        self._set(
+            params={k: self.__as_tuple(v) for k, v in params.items()},
+            _boost=boost
         )
-        self._boost = boost
-        self.__validate_params()
+        assert any(self.params.values()), self._validation_msg
 
     def __repr__(self):
         return 'Bool(boost={}, {})'.format(self._boost, dict_to_params(self.params))
 
-    def __validate_params(self):
-        """Ensure parameters are in correct format."""
-        assert any(self.params.values()), self._validation_msg
-        for key, params in self.params.items():
-            if isinstance(params, Query):
-                self.params[key] = [params]
-            elif not isinstance(params, list):
-                self.params[key] = list(params)
+    @staticmethod
+    def __as_tuple(params):
+        """Ensure parameters are in correct format.
+
+        Duplicate clauses are dropped while keeping the original order.
+        """
+        if not params:
+            return ()
+        if isinstance(params, Query):
+            return (params,)
+        return tuple(OrderedDict.fromkeys(params))
+
+    @property
+    def _structure(self):
+        return tuple(self.params[k] for k in self._params), self._boost
 
     @property
     def must(self):
         """Get the must conditions."""
-        return self.params['must']
+        return list(self.params['must'])
 
     @property
     def must_not(self):
         """Get the must_not conditions."""
-        return self.params['must_not']
+        return list(self.params['must_not'])
 
     @property
     def should(self):
         """Get the should conditions."""
-        return self.params['should']
+        return list(self.params['should'])
 
     @property
     def filter(self):
         """Get the filter conditions."""
-        return self.params['filter']
+        return list(self.params['filter'])
 
     def __add__(self, other):
         """Merge the parameters of two queries into one."""
@@ -389,8 +636,8 @@ class Bool(Query):
         if not isinstance(other, Bool):
             other = Bool(must=other)
 
-        params = defaultdict(list, deepcopy(self.params))
-        for k, v in other.params.items():
+        params = defaultdict(list)
+        for k, v in list(self.params.items()) + list(other.params.items()):
             params[k].extend(v)
         return Bool(**params)
     __radd__ = __add__
@@ -428,11 +675,127 @@ class Bool(Query):
                 objects individual parameters
         """
         params = self.filtered_params
-        compressed = params.pop(destination, [])
+        compressed = list(params.pop(destination, []))
         for name, clauses in params.items():
             compressed.append(Bool(**{name: clauses}))
         return compressed
 
+    def optimize(self):
+        """Return an equivalent query which is cheaper to execute.
+
+        Nested bool queries are flattened into their parent, term
+        disjunctions on the same field are folded into a terms query and
+        duplicate clauses are dropped. Ranges on the same field are not
+        merged, as on a field with several values each range may match a
+        different value.
+
+        Returns:
+            Query: Optimized query.
+        """
+        try:
+            return self._optimized
+        except AttributeError:
+            self._set(_optimized=self.__optimize())
+            return self._optimized
+
+    def __optimize(self):
+        children = {k: [i.optimize() for i in v] for k, v in self.params.items()}
+        params = defaultdict(list)
+        for name in self._params:
+            for clause in children[name]:
+                lifted = self.__lift(name, clause)
+                if lifted is None:
+                    params[name].append(clause)
+                else:
+                    for k, v in lifted.items():
+                        params[k].extend(v)
+        # lifting must not change whether should clauses are required
+        if self.__requires_should(params) != self.__requires_should(children):
+            params = children
+        # a lone disjunction which has to match can be the parent's should
+        disjunction = params['must'][0] if len(params['must']) == 1 else None
+        if not (params['filter'] or params['should']) \
+                and self.__lift('should', disjunction) is not None:
+            params['should'] = disjunction.should
+            params['must'] = []
+        params['must_not'] = _fold_terms(params['must_not'])
+        params['should'] = _fold_terms(params['should'])
+        query = Bool(boost=self._boost, **params)
+        # a lone clause scored on its own is equivalent to the clause
+        if self._boost is None and list(query.filtered_params) in (['must'], ['should']):
+            clauses = query.must + query.should
+            if len(clauses) == 1:
+                return clauses[0]
+        return query
+
+    @property
+    def boosted(self):
+        """Whether a boost has been applied to the query or its clauses."""
+        return self._boost is not None or any(
+            i.boosted for params in self.params.values() for i in params
+        )
+
+    @property
+    def empty(self):
+        """Whether the query provably matches no documents.
+
+        This is a lightweight check for contradicting conditions which
+        holds for any field, e.g. `df.x.isin([])` or a condition required
+        together with its negation. Conditions on the values of a field
+        are not compared to each other, as `(df.tags == 'a') &
+        (df.tags == 'b')` matches documents with both tags, and values
+        written differently may be equal for dates or normalized keywords.
+        """
+        required = self.must + self.filter
+        if any(i.empty for i in required):
+            return True
+        if self.__requires_should(self.params) and all(i.empty for i in self.should):
+            return True
+        excluded = set(self.must_not)
+        if any(i in excluded for i in required):
+            return True
+        missing = {i.value for i in excluded if type(i) is Exists}
+        return any(_field(i) in missing for i in required)
+
+    def _filter_context(self):
+        if self.must or self.filter:
+            # should clauses are optional and only contribute to the score
+            return Bool(filter=self.must + self.filter, must_not=self.must_not)
+        if self.should:
+            return Bool(filter=Bool(should=self.should), must_not=self.must_not)
+        return Bool(must_not=self.must_not)
+
+    @staticmethod
+    def __requires_should(params):
+        """Whether at least one should clause has to match."""
+        return bool(params['should']) and not (params['must'] or params['filter'])
+
+    @staticmethod
+    def __lift(name, clause):
+        """Get the parameters of a nested bool which can join its parent.
+
+        Returns:
+            dict: Clauses keyed by the parent parameter they belong in.
+                None if the clause cannot be flattened into the parent.
+        """
+        if not isinstance(clause, Bool):
+            return None
+        params = clause.filtered_params
+        if name == 'filter' and 'should' not in params:
+            return {'filter': clause.must + clause.filter, 'must_not': clause.must_not}
+        if clause._boost is not None:
+            return None
+        if name == 'must' and 'should' not in params:
+            return {'must': clause.must, 'filter': clause.filter, 'must_not': clause.must_not}
+        if name == 'should' and list(params) == ['should']:
+            return {'should': clause.should}
+        if name == 'must_not' and list(params) == ['should']:
+            return {'must_not': clause.should}
+        # not (not x and not y) is x or y, so only a single negation is lifted
+        if name == 'must_not' and list(params) == ['must_not'] and len(clause.must_not) == 1:
+            return {'filter': clause.must_not}
+        return None
+
     def __invert__(self):
         return Bool(
             must=[self.__negate(i) for i in self.should] + self.must_not,
@@ -450,7 +813,7 @@ class Bool(Query):
         # # if must is only parameter and contains only one condition
         # # then convert that one condition to a stand-alone query
         if len(self.filtered_params) == 1 == len(self.must):
-            return self.must[0]()
+            return self.params['must'][0]()
         return {self.key: self._finalize_params()}
 
     @property
@@ -458,7 +821,7 @@ class Bool(Query):
         # if must is only parameter and contains only one condition
         # then convert that one condition to a stand-alone query
         if len(self.filtered_params) == 1 == len(self.must):
-            return self.must[0].boost(self._boost)()
+            return self.params['must'][0].boost(self._boost)()
         return {self.key: dict(self._finalize_params(), **{'boost': self._boost})}
 
     @property
@@ -474,33 +837,111 @@ class Bool(Query):
         }
 
 
+def _comparable(a, b):
+    """Whether two range bounds can be compared to each other."""
+    numbers = six.integer_types + (float,)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return False
+    if isinstance(a, numbers) and isinstance(b, numbers):
+        return True
+    return type(a) is type(b) and not isinstance(a, six.string_types)
+
+
+def _field(query):
+    """Get the field a query requires a value for."""
+    if type(query) is Exists:
+        return query.value
+    if type(query) in (Term, Terms, Range, Regexp, Wildcard, Prefix, Match):
+        return query.field
+    return None
+
+
+def _fold_terms(clauses):
+    """Fold term clauses on the same field where any may match into terms."""
+    def foldable(clause):
+        if clause._boost is not None:
+            return False
+        return type(clause) is Term or (type(clause) is Terms and
+                                        isinstance(clause.value, (list, tuple)))
+
+    counts = Counter(i.field for i in clauses if foldable(i))
+    folded = []
+    positions = {}
+    for clause in clauses:
+        if not foldable(clause) or counts[clause.field] < 2:
+            folded.append(clause)
+            continue
+        values = list(clause.value) if type(clause) is Terms else [clause.value]
+        if clause.field in positions:
+            folded[positions[clause.field]].extend(values)
+        else:
+            positions[clause.field] = len(folded)
+            folded.append(values)
+    for field, i in positions.items():
+        values = folded[i]
+        if _scalar_type(values) is not None:
+            values = list(OrderedDict.fromkeys(values))
+        else:
+            values = list(OrderedDict((_freeze(v), v) for v in values).values())
+        folded[i] = Terms.chunked(field, values)
+    return [j for i in folded for j in (i if isinstance(i, list) else [i])]
+
+
 class Script(Query):
-    """Find documents matching a painless scripts as a query."""
+    """Find documents matching a painless scripts as a query.
 
+    Values which change between requests should be passed as `params`
+    rather than formatted into the source. Elasticsearch caches compiled
+    scripts by their source, so a parameterised script is compiled once
+    and reused for any values.
+    """
+
+    __slots__ = ('source', 'params', 'id')
     key = 'script'
 
-    def __init__(self, source, boost=None):
-        """Init Exists.
+    def __init__(self, source=None, params=None, id=None, boost=None):
+        """Init Script.
 
         Args:
-            source (str): Painless script
+            source (str, optional): Painless script. Default None.
+            params (dict, optional): Variables the script reads from
+                `params`. Default None.
+            id (str, optional): Name of a stored script to run instead of
+                a source. Default None.
             boost (float, optional): Weight given to this query.
                 Default None.
         """
-        self.source = source
-        self._boost = boost
+        if (source is None) == (id is None):
+            raise ValueError("Either a source or a stored script id is required.")
+        self._set(source=source, params=dict(params or {}), id=id, _boost=boost)
+
+    @property
+    def _structure(self):
+        return self.source, _freeze(self.params), self.id, self._boost
 
     def __repr__(self):
-        return "Script(source='{}', boost={})".format(self.source, self._boost)
+        if self.id is not None:
+            return "Script(id='{}', params={}, boost={})".format(
+                self.id, self.params, self._boost)
+        return "Script(source='{}', params={}, boost={})".format(
+            self.source, self.params, self._boost)
+
+    @property
+    def script(self):
+        """Script formatted for elasticsearch."""
+        if self.id is not None:
+            script = {'id': self.id}
+        else:
+            script = {'source': self.source, 'lang': 'painless'}
+        if self.params:
+            script['params'] = self.params
+        return script
 
     @property
     def _query(self):
         return {
             self.key: {
-                self.key: {
-                    'source': self.source,
-                    'lang': 'painless'
-                }
+                self.key: self.script
             }
         }
 
@@ -508,10 +949,7 @@ class Script(Query):
     def _boosted_query(self):
         return {
             self.key: {
-                self.key: {
-                    'source': self.source,
-                    'lang': 'painless'
-                },
+                self.key: self.script,
                 'boost': self._boost
             }
         }
@@ -0,0 +1,219 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Json serialization of request bodies sent to elasticsearch.
+
+Classes:
+    Compiled: Read-only query body which memoizes its json
+    Serializer: Elasticsearch serializer which reuses memoized json
+
+Functions:
+    json_codec: Get the decoder and encoder of a json library
+"""
+import json
+import math
+
+from six import string_types
+
+_encoder = None
+
+
+def _default(data):
+    """Encode values json does not support, such as dates and numpy types."""
+    global _encoder
+    if _encoder is None:
+        # imported on first use as the client's serializer imports numpy and pandas
+        from elasticsearch.serializer import JSONSerializer
+        _encoder = JSONSerializer()
+    return _encoder.default(data)
+
+
+def _finite(data):
+    """Check that data contains no NaN or infinite floats."""
+    if isinstance(data, float):
+        return not (math.isnan(data) or math.isinf(data))
+    if isinstance(data, dict):
+        return all(_finite(i) for i in data.values())
+    if isinstance(data, (list, tuple)):
+        return all(_finite(i) for i in data)
+    return True
+
+
+def _orjson():
+    import orjson
+    option = orjson.OPT_NON_STR_KEYS
+
+    def encode(data):
+        if not _finite(data):
+            # orjson writes NaN and Infinity as null
+            raise ValueError("Out of range float values are not supported by orjson.")
+        return orjson.dumps(data, default=_default, option=option).decode('utf-8')
+    return orjson.loads, encode
+
+
+def _ujson():
+    import ujson
+
+    def encode(data):
+        return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+    return ujson.loads, encode
+
+
+def _simdjson():
+    import simdjson
+    # simdjson only decodes
+    return simdjson.loads, dumps
+
+
+def _json():
+    return json.loads, dumps
+
+
+# json libraries in order of preference
+JSON_LIBRARIES = ('orjson', 'ujson', 'simdjson', 'json')
+_codecs = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'simdjson': _simdjson,
+    'json': _json
+}
+
+
+def json_codec(library=None):
+    """Get the decoder and encoder of a json library.
+
+    Args:
+        library (str, optional): Name of the library, one of
+            `JSON_LIBRARIES`. Defaults to None, the first installed.
+
+    Returns:
+        tuple: Name of the library, its loads and its dumps function
+
+    Raises:
+        ValueError: If the library is not supported
+        ImportError: If the library is not installed
+    """
+    if library is None:
+        for name in JSON_LIBRARIES:
+            try:
+                return json_codec(name)
+            except ImportError:
+                pass
+    if library not in _codecs:
+        raise ValueError("Json library must be one of {}, not `{}`.".format(
+            ', '.join(JSON_LIBRARIES), library))
+    loads, encode = _codecs[library]()
+    return library, loads, encode
+
+
+def _serialization_error(data, error):
+    """Get the client's error for data which is not valid json."""
+    from elasticsearch.exceptions import SerializationError
+    return SerializationError(data, error)
+
+
+def dumps(data, sort_keys=False):
+    """Serialize data to a compact json string."""
+    return json.dumps(data,
+                      default=_default,
+                      ensure_ascii=False,
+                      sort_keys=sort_keys,
+                      separators=(',', ':'))
+
+
+class Compiled(dict):
+    """Read-only query body formatted for elasticsearch.
+
+    Query objects are immutable so the body they compile to is too. This
+    allows the serialized json to be computed once and reused for every
+    request the body is a part of.
+    """
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+    @property
+    def json(self):
+        """Get the memoized json representation of the body."""
+        try:
+            return self.__json
+        except AttributeError:
+            self.__json = dumps(self)
+            return self.__json
+
+
+class Serializer(object):
+    """Serialize request bodies reusing the json of compiled queries.
+
+    Top-level values of a body which are `Compiled` are spliced into the
+    request as their memoized json instead of being serialized again.
+    Responses are decoded, and other bodies encoded, with the fastest
+    installed json library. Implements the interface of the elasticsearch
+    client's serializers.
+
+    Attributes:
+        library: Name of the json library
+    """
+
+    mimetype = 'application/json'
+
+    def __init__(self, library=None):
+        """Init Serializer.
+
+        Args:
+            library (str, optional): Name of the json library, one of
+                `JSON_LIBRARIES`. Defaults to None, the first installed.
+        """
+        self.library, self._loads, self._dumps = json_codec(library)
+
+    def __repr__(self):
+        return "{}(library='{}')".format(type(self).__name__, self.library)
+
+    def default(self, data):
+        """Encode values json does not support."""
+        return _default(data)
+
+    def loads(self, s):
+        """Deserialize json."""
+        try:
+            return self._loads(s)
+        except (ValueError, TypeError) as e:
+            raise _serialization_error(s, e)
+
+    def dumps(self, data):
+        """Serialize data to json."""
+        if isinstance(data, string_types):
+            return data
+        if isinstance(data, Compiled):
+            return data.json
+        try:
+            if isinstance(data, dict) and any(isinstance(i, Compiled)
+                                              for i in data.values()):
+                return '{{{}}}'.format(','.join(
+                    '{}:{}'.format(dumps(k), self.__encode(v))
+                    for k, v in data.items()
+                ))
+            return self.__encode(data)
+        except (ValueError, TypeError) as e:
+            raise _serialization_error(data, e)
+
+    def __encode(self, value):
+        if isinstance(value, Compiled):
+            return value.json
+        try:
+            return self._dumps(value)
+        except (ValueError, TypeError, OverflowError):
+            # e.g. integers over 64 bits, which only the json module encodes
+            return dumps(value)
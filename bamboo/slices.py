@@ -0,0 +1,134 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Slices of a dataframe's documents which are read independently.
+
+Slices hold only the request for their documents, not the dataframe or
+its client, so they are cheap to pickle and read in other processes.
+"""
+import pickle
+
+from .config import connect
+from .utils import hit_source, to_columns
+
+
+class Slice(object):
+    """Part of the documents matching a dataframe's conditions.
+
+    Each document matching the conditions is in exactly one of the slices
+    of a dataframe, see `DataFrame.partitions`. A slice is read with a
+    sliced scroll using a client of the process reading it.
+
+    Attributes:
+        index: Names of the indices to search
+        body: Query body in json format
+        id: Number of the slice
+        max: Number of slices
+        fields: The field names returned from source. All if None.
+        connection: Parameters of the elasticsearch client
+        options: Request options such as preference and routing
+    """
+
+    def __init__(self, index, body, id=0, max=1, fields=None, connection=None, options=None):
+        """Init Slice.
+
+        Args:
+            index (str): Names of the indices to search
+            body (dict): Query body in json format
+            id (int, optional): Number of the slice. Defaults to 0.
+            max (int, optional): Number of slices. Defaults to 1.
+            fields (list, optional): The field names that should be returned
+                from source. If None then returns all. Defaults to None.
+            connection (dict, optional): Parameters of the elasticsearch
+                client. Defaults to None, a client for localhost.
+            options (dict, optional): Request options such as preference
+                and routing. Defaults to None.
+        """
+        self.index = index
+        self.body = dict(body)
+        self.id = id
+        self.max = max
+        self.fields = fields
+        self.connection = dict(connection or {})
+        self.options = dict(options or {})
+
+    def __repr__(self):
+        return '{}(index={}, id={}, max={})'.format(
+            type(self).__name__, self.index, self.id, self.max
+        )
+
+    @property
+    def _es(self):
+        return connect(self.connection)
+
+    def collect(self):
+        """Collect the documents of the slice.
+
+        Returns:
+            generator: Document sources in no particular order
+        """
+        from elasticsearch.helpers import scan
+        body = self.body
+        if self.max > 1:
+            body = dict(body, slice={'id': self.id, 'max': self.max})
+        hits = scan(client=self._es,
+                    index=self.index,
+                    query=body,
+                    _source=self.fields,
+                    **self.options)
+        return (hit_source(i) for i in hits)
+
+    def to_pandas(self):
+        """Collect the documents of the slice as a pandas DataFrame.
+
+        Returns:
+            pd.DataFrame: Documents with fields in dot-notation
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError('Install pandas for pandas support.')
+        else:
+            columns, count = to_columns(self.collect())
+            return pd.DataFrame(columns, index=pd.RangeIndex(count))
+
+
+def read_frame(piece):
+    """Read a slice into a pandas DataFrame serialized for another process.
+
+    Frames are serialized as Arrow IPC streams if pyarrow is installed and
+    supports their columns, otherwise they are pickled, which copies the
+    column blocks rather than the documents.
+
+    Args:
+        piece (Slice): Slice to read
+
+    Returns:
+        tuple: Format and bytes of the serialized frame, see `load_frame`
+    """
+    frame = piece.to_pandas()
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pass
+    else:
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):  # mixed types in a column
+            pass
+        else:
+            sink = pa.BufferOutputStream()
+            writer = pa.ipc.new_stream(sink, table.schema)
+            writer.write_table(table)
+            writer.close()
+            return 'arrow', sink.getvalue().to_pybytes()
+    return 'pickle', pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_frame(serialized):
+    """Load a pandas DataFrame serialized by `read_frame`."""
+    kind, payload = serialized
+    if kind == 'arrow':
+        import pyarrow as pa
+        return pa.ipc.open_stream(payload).read_all().to_pandas()
+    return pickle.loads(payload)
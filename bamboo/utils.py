@@ -3,7 +3,13 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """General utility functions."""
 import functools
+import threading
 import warnings
+from collections import OrderedDict
+
+from six.moves.queue import Full, Queue
+
+_MISSING = float('nan')
 
 
 def deprecated(func):
@@ -25,3 +31,114 @@ def deprecated(func):
 def dict_to_params(d):
     """Convert dictionary to string representation of parameters."""
     return ', ' .join('{}={}'.format(k, v) for k, v in d.items())
+
+
+def hit_source(hit):
+    """Get the source of a search hit including its requested fields."""
+    source = hit.get('_source', {})
+    for name, values in hit.get('fields', {}).items():
+        source[name] = values[0] if len(values) == 1 else values
+    return source
+
+
+def nested_to_dot(hit, namespace=''):
+    """Recursively flattens nested objects to use dot-notation."""
+    d = {}
+    for k, v in hit.items():
+        key = '{}.{}'.format(namespace, k) if namespace else k
+        if isinstance(v, dict):
+            d.update(nested_to_dot(v, key))
+        else:
+            d[key] = v
+    return d
+
+
+def to_columns(docs):
+    """Collect documents into columns of values in dot-notation.
+
+    Each document is flattened straight into the columns rather than into
+    an intermediate row. Values missing from a document are NaN, as in a
+    pandas DataFrame built from rows.
+
+    Args:
+        docs (iterable): Documents, e.g. decoded hit sources
+
+    Returns:
+        tuple: OrderedDict of the values of each field by name in order of
+            first appearance, and the number of documents
+    """
+    columns = OrderedDict()
+    count = 0
+    for doc in docs:
+        _add_to_columns(columns, count, doc, '')
+        count += 1
+    for values in columns.values():
+        values.extend([_MISSING] * (count - len(values)))
+    return columns, count
+
+
+def _add_to_columns(columns, row, doc, namespace):
+    for k, v in doc.items():
+        key = namespace + k
+        if isinstance(v, dict):
+            _add_to_columns(columns, row, v, key + '.')
+            continue
+        values = columns.get(key)
+        if values is None:
+            values = columns[key] = []
+        if len(values) == row + 1:
+            # the document has the field both in dot-notation and as an object
+            values[-1] = v
+            continue
+        if len(values) < row:
+            values.extend([_MISSING] * (row - len(values)))
+        values.append(v)
+
+
+def prefetch(iterable, depth=1):
+    """Iterate while the next items are produced in a background thread.
+
+    At most `depth` items are produced ahead of the consumer, which bounds
+    memory. Errors raised while producing are raised to the consumer.
+
+    Args:
+        iterable (iterable): Items to produce
+        depth (int, optional): Number of items to produce ahead.
+            Defaults to 1.
+    """
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+        else:
+            put((done, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
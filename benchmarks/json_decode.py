@@ -0,0 +1,83 @@
+"""Compare the decode throughput of the installed json libraries.
+
+Usage:
+    python benchmarks/json_decode.py [--docs N] [--fields N] [--repeat N]
+
+Decodes a generated search response, like a page of a scroll or export,
+with each installed json library, then builds a pandas DataFrame from its
+hits as `DataFrame.to_pandas` does. No cluster is needed.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+from timeit import default_timer
+
+from bamboo.serializer import JSON_LIBRARIES, Serializer, dumps
+from bamboo.utils import hit_source, nested_to_dot, to_columns
+
+
+def response(docs, fields):
+    """Generate a search response with nested documents of mixed types."""
+    rand = random.Random(0)
+    hits = []
+    for i in range(docs):
+        source = {'id': i, 'ns': {}}
+        for j in range(fields):
+            value = [rand.randint(0, 10 ** 6), rand.random(), rand.random() < 0.5,
+                     'value-{}'.format(rand.randint(0, 1000))][j % 4]
+            if j % 2:
+                source['ns']['attr{}'.format(j)] = value
+            else:
+                source['attr{}'.format(j)] = value
+        hits.append({'_index': 'index', '_type': '_doc', '_id': str(i),
+                     '_score': None, '_source': source})
+    return dumps({'took': 1, 'timed_out': False, 'hits': {'total': docs, 'hits': hits}})
+
+
+def timed(func, repeat):
+    """Get the result and the best time of a function in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        result = func()
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=10000)
+    parser.add_argument('--fields', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    raw = response(args.docs, args.fields)
+    megabytes = len(raw.encode('utf-8')) / 1024.0 ** 2
+    print('{:.1f}MB, {} documents of {} fields'.format(megabytes, args.docs, args.fields))
+    print('{:>10} {:>12} {:>12}'.format('library', 'decode_MB/s', 'docs/s'))
+    decoded = None
+    for library in JSON_LIBRARIES:
+        try:
+            serializer = Serializer(library)
+        except ImportError:
+            print('{:>10} {:>12} {:>12}'.format(library, '-', '-'))
+            continue
+        decoded, elapsed = timed(lambda: serializer.loads(raw), args.repeat)
+        print('{:>10} {:>12.1f} {:>12.0f}'.format(
+            library, megabytes / elapsed, args.docs / elapsed))
+
+    try:
+        import pandas as pd
+    except ImportError:
+        return
+    sources = [hit_source(i) for i in decoded['hits']['hits']]
+    _, rows = timed(lambda: pd.DataFrame([nested_to_dot(i) for i in sources]), args.repeat)
+    _, columns = timed(lambda: pd.DataFrame(to_columns(sources)), args.repeat)
+    print('{:>10} {:>12} {:>12.0f}'.format('rows', '-', args.docs / rows))
+    print('{:>10} {:>12} {:>12.0f}'.format('columns', '-', args.docs / columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare latency and error of sampled and exact aggregations.
+
+Usage:
+    python benchmarks/sampled_aggregations.py INDEX FIELD [--hosts HOST ...]
+        [--sample-sizes N ...] [--repeat N]
+
+Runs against a live cluster, ideally with an index of many millions of
+documents. The shard request cache is disabled so each run is computed.
+"""
+from __future__ import print_function
+
+import argparse
+from timeit import default_timer
+
+from bamboo import DataFrame, config
+
+
+def timed(func, repeat):
+    """Get the result and the best latency of a function in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        result = func()
+        elapsed = (default_timer() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def relative_error(estimate, exact):
+    if not exact:
+        return 0.0
+    return abs(estimate - exact) / abs(exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('index')
+    parser.add_argument('field', help='numeric field, in dot-notation')
+    parser.add_argument('--hosts', nargs='+', default=['localhost'])
+    parser.add_argument('--sample-sizes', nargs='+', type=int,
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    config(hosts=args.hosts)
+    df = DataFrame(args.index).with_options(request_cache=False)
+    field = df
+    for name in args.field.split('.'):
+        field = getattr(field, name)
+
+    average, latency = timed(field.average, args.repeat)
+    median, _ = timed(lambda: field.percentiles()[3]['value'], 1)
+    print('{:>12} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+        'sample_size', 'docs', 'avg_ms', 'avg_error', 'std_error', 'median_error'))
+    print('{:>12} {:>12} {:>12.1f} {:>12.4%} {:>12} {:>12.4%}'.format(
+        'exact', df.count(), latency, 0, '-', 0))
+    for size in args.sample_sizes:
+        estimate, latency = timed(lambda: field.average(sample_size=size), args.repeat)
+        percentiles = field.percentiles(sample_size=size)
+        print('{:>12} {:>12} {:>12.1f} {:>12.4%} {:>12.4g} {:>12.4%}'.format(
+            size,
+            estimate.doc_count,
+            latency,
+            relative_error(estimate.value, average),
+            estimate.standard_error or float('nan'),
+            relative_error(percentiles.value[3]['value'], median)))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,13 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 """Install bamboo package."""
+import os
+import re
+
 from setuptools import setup
 
-VERSION = '0.3.2'
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bamboo', '__init__.py')) as f:
+    VERSION = re.search(r"__version__ = '(.+)'", f.read()).group(1)
 
 setup(
     name='elasticsearch-bamboo',
@@ -44,6 +48,8 @@ setup(
             'pandas',
             'pytest',
         ],
-        pandas=['pandas']
+        pandas=['pandas'],
+        dask=['dask[dataframe]'],
+        json=['orjson']
     )
 )
@@ -1,4 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import pytest
 
 
 def test_value_counts(df):
@@ -133,3 +135,35 @@ def test_date_agg_on_no_matches(df):
     assert df.count() == 0
     avg = df.ns3.test_date.average()
     assert avg == None
+
+
+def test_sampled_average(df):
+    r = df.ns1.attr1.average(sample_size=100)
+    assert r.value == 5.25
+    assert r.doc_count == 17
+    assert r.standard_error == pytest.approx(3.191786333700926 / 2)
+    r = df.ns1.attr1.average(sample_size=1)
+    assert 1 <= r.doc_count <= 7  # a document from each of the 7 shards
+
+
+def test_sampled_date_average(df):
+    r = df.ns3.test_date.average(sample_size=100)
+    assert r.value == datetime(2019, 7, 5, 16, 41, 58, 571000)
+    assert isinstance(r.standard_error, timedelta)
+
+
+def test_sampled_percentiles(df):
+    r = df.ns1.attr1.percentiles(sample_size=100)
+    assert r.value == df.ns1.attr1.percentiles()
+    assert r.doc_count == 17
+
+
+def test_sampled_describe(df):
+    r = df[df.ns1.attr1 > 1].ns1.attr1.describe(sample_size=100)
+    assert r.value == {'count': 3, 'max': 10.0, 'sum': 20.0, 'avg': 20 / 3.0, 'min': 5.0}
+    assert r.doc_count == 3
+
+
+def test_sampled_empty(df):
+    r = df[df.ns1.attr1.isin([])].ns1.attr1.average(sample_size=100)
+    assert r == (None, 0, None)
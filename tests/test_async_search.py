@@ -0,0 +1,97 @@
+import pytest
+
+from bamboo import AsyncSearch, SearchTimeoutError
+
+AGGS = {'avg': {'avg': {'field': 'ns1.attr1'}}}
+
+
+class Transport(object):
+    """Async search api which completes after a number of polls."""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.requests = []
+
+    def perform_request(self, method, url, params=None, body=None):
+        self.requests.append((method, url, params, body))
+        if method == 'DELETE':
+            return {'acknowledged': True}
+        if method == 'GET':
+            self.polls -= 1
+        running = self.polls > 0
+        return {
+            'id': 'search-id',
+            'is_running': running,
+            'is_partial': running,
+            'response': {
+                'aggregations': {
+                    'avg': {'value': 1.0 if running else 5.25},
+                    'sample': {'avg': {'value': 5.0}}
+                }
+            }
+        }
+
+
+@pytest.fixture
+def transport(df, monkeypatch):
+    transport = Transport(polls=2)
+    monkeypatch.setattr(df.config.connection, 'transport', transport)
+    return transport
+
+
+def test_agg_async(df, transport):
+    transport.polls = 3
+    df = df[df.ns1.attr1 > 1]
+    search = df.agg(AGGS, async_search=True)
+    method, url, params, body = transport.requests[0]
+    assert (method, url) == ('POST', '/bamboo-test-index-/_async_search')
+    assert params == {'size': 0, 'keep_alive': '5d', 'keep_on_completion': 'true',
+                      'wait_for_completion_timeout': '0s'}
+    assert body == dict(df._compile(scoring=False), aggs=AGGS)
+    assert search.id == 'search-id'
+    assert search.key == 'aggregations'
+    assert not search.done()
+    assert search.partial() == {'avg': {'value': 1.0}, 'sample': {'avg': {'value': 5.0}}}
+    assert search.result()['avg'] == {'value': 5.25}
+    assert search.done()
+    assert len(transport.requests) == 4
+
+
+def test_agg_async_sample(df, transport):
+    search = df.sample(10).agg(AGGS, async_search=True)
+    assert search.key == 'aggregations.sample'
+    assert search.result() == {'avg': {'value': 5.0}}
+
+
+def test_submit_options(df, transport):
+    df.with_options(preference='session').submit(size=10, keep_alive='1h')
+    _, _, params, body = transport.requests[0]
+    assert params['preference'] == 'session'
+    assert params['size'] == 10
+    assert params['keep_alive'] == '1h'
+    assert body == df._compile(scoring=False)
+
+
+def test_submit_boolean_options(df, transport):
+    df.with_options(request_cache=True).submit(track_total_hits=False, stored_fields=['a', 'b'])
+    _, _, params, _ = transport.requests[0]
+    assert params['request_cache'] == 'true'
+    assert params['track_total_hits'] == 'false'
+    assert params['stored_fields'] == 'a,b'
+
+
+def test_result_timeout(df, transport):
+    transport.polls = 100
+    search = df.submit()
+    with pytest.raises(SearchTimeoutError):
+        search.result(timeout=0)
+    assert transport.requests[-1][2]['wait_for_completion_timeout'] == '0ms'
+
+
+def test_resume(df, transport):
+    search_id = df.agg(AGGS, async_search=True).id
+    search = AsyncSearch(search_id, key='aggregations')
+    assert search.result()['avg'] == {'value': 5.25}
+    assert transport.requests[-1][1] == '/_async_search/search-id'
+    search.cancel()
+    assert transport.requests[-1][:2] == ('DELETE', '/_async_search/search-id')
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from bamboo import DataFrame, ResultCache
+from bamboo.cache import RequestCoalescer, request_key
+
+SOURCE = ('cluster', 'index')
+
+
+def _fetch(cache, key, result, version=1):
+    calls = []
+
+    def request():
+        calls.append(key)
+        return result
+
+    return cache.fetch(key, SOURCE, request, lambda: version), calls
+
+
+def test_hit():
+    cache = ResultCache()
+    result, calls = _fetch(cache, 'a', {'count': 1})
+    assert result == {'count': 1} and calls
+    result, calls = _fetch(cache, 'a', {'count': 2})
+    assert result == {'count': 1} and not calls
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+    assert cache.stats['hit_rate'] == 0.5
+
+
+def test_cached_result_is_not_shared():
+    cache = ResultCache()
+    _fetch(cache, 'a', {'hits': {'hits': []}})
+    result, _ = _fetch(cache, 'a', None)
+    result['hits']['hits'].append(1)
+    result, _ = _fetch(cache, 'a', None)
+    assert result == {'hits': {'hits': []}}
+
+
+def test_invalidated_on_version_change():
+    cache = ResultCache(check_interval=0)
+    _fetch(cache, 'a', {'count': 1}, version=1)
+    result, calls = _fetch(cache, 'a', {'count': 2}, version=2)
+    assert result == {'count': 2} and calls
+    assert cache.stats['invalidations'] == 1
+
+
+def test_version_checked_once_per_interval():
+    cache = ResultCache(check_interval=60)
+    _fetch(cache, 'a', {'count': 1}, version=1)
+    result, calls = _fetch(cache, 'a', {'count': 2}, version=2)
+    assert result == {'count': 1} and not calls
+
+
+def test_ttl(monkeypatch):
+    cache = ResultCache(ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr('bamboo.cache.time.time', lambda: now[0])
+    _fetch(cache, 'a', {'count': 1})
+    now[0] += 11
+    result, calls = _fetch(cache, 'a', {'count': 2})
+    assert result == {'count': 2} and calls
+    assert cache.stats['expirations'] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=30)
+    _fetch(cache, 'a', {'count': 1})  # 11 bytes
+    _fetch(cache, 'b', {'count': 2})
+    _fetch(cache, 'a', None)  # a is most recently used
+    _fetch(cache, 'c', {'count': 3})
+    assert len(cache) == 2
+    assert cache.stats['evictions'] == 1
+    assert cache.stats['bytes'] == 22
+    _, calls = _fetch(cache, 'a', None)
+    assert not calls
+    _, calls = _fetch(cache, 'b', {'count': 2})
+    assert calls
+
+
+def test_result_above_budget_not_cached():
+    cache = ResultCache(max_bytes=5)
+    _fetch(cache, 'a', {'count': 1})
+    assert len(cache) == 0
+
+
+def test_request_key():
+    key = request_key('cluster', 'index', 'search', {'body': {'query': {}}, 'size': 0})
+    assert key == request_key('cluster', 'index', 'search', {'size': 0, 'body': {'query': {}}})
+    assert key != request_key('cluster', 'index', 'count', {'body': {'query': {}}, 'size': 0})
+    assert key != request_key('cluster', 'other', 'search', {'body': {'query': {}}, 'size': 0})
+
+
+@pytest.fixture
+def cached_df(df):
+    return DataFrame(df.index, cache=ResultCache())
+
+
+def test_dataframe_cache_shared(cached_df):
+    df = cached_df[cached_df.ns1.attr1 > 1]
+    assert df.cache is cached_df.cache
+
+
+def test_dataframe_count_cached(cached_df):
+    df = cached_df[cached_df.ns1.attr1.exists()]
+    assert df.count() == 4
+    assert df.count() == 4
+    assert df.cache.stats['hits'] == 1
+
+
+def test_dataframe_aggregation_cached(cached_df):
+    counts = cached_df.ns1.attr1.value_counts()
+    assert cached_df.ns1.attr1.value_counts() == counts
+    assert cached_df.ns1.attr1.describe()
+    assert cached_df.cache.stats['hits'] == 1
+    assert cached_df.cache.stats['misses'] == 2
+
+
+def _concurrently(func, n=4):
+    results = [None] * n
+    errors = [None] * n
+
+    def run(i):
+        try:
+            results[i] = func()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_coalesce_concurrent_requests():
+    inflight = RequestCoalescer()
+    calls = []
+
+    def request():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'hits': {'hits': [{'_source': {'a': 1}}]}}
+
+    results, errors = _concurrently(lambda: inflight.fetch('a', request))
+    assert len(calls) == 1
+    assert errors == [None] * 4
+    assert all(i == {'hits': {'hits': [{'_source': {'a': 1}}]}} for i in results)
+    assert len(set(id(i['hits']['hits'][0]) for i in results)) == 4
+    assert len(inflight) == 0
+
+
+def test_coalesce_different_keys():
+    inflight = RequestCoalescer()
+    calls = []
+    inflight.fetch('a', lambda: calls.append('a'))
+    inflight.fetch('a', lambda: calls.append('a'))
+    inflight.fetch('b', lambda: calls.append('b'))
+    assert calls == ['a', 'a', 'b']
+
+
+def test_coalesce_error_raised_for_waiters():
+    inflight = RequestCoalescer()
+
+    def request():
+        time.sleep(0.2)
+        raise ValueError('failed')
+
+    results, errors = _concurrently(lambda: inflight.fetch('a', request))
+    assert all(isinstance(i, ValueError) for i in errors)
+    assert len(inflight) == 0
+
+
+def test_dataframe_concurrent_counts(df):
+    df = df[df.ns1.attr1.exists()]
+    results, errors = _concurrently(df.count)
+    assert results == [4] * 4
@@ -1,6 +1,8 @@
 import os
+import pickle
+import socket
 
-from bamboo.config import Config
+from bamboo.config import Config, _connections, connect
 
 HOSTS = ['host1', 'host2', 'host3']
 ENV_HOSTS = ' '.join(HOSTS)  # "host1 host2 host3"
@@ -28,3 +30,47 @@ def test_kwargs_override_env(monkeypatch):
     monkeypatch.setenv('BAMBOO_HOSTS', DUMMY_HOSTS[0])
     config = Config(hosts=HOSTS)
     assert config['hosts'] == HOSTS
+
+
+def test_connection_shared():
+    assert Config(hosts=HOSTS).connection is Config(hosts=list(HOSTS)).connection
+    assert Config(hosts=HOSTS).connection is not Config(hosts=DUMMY_HOSTS).connection
+
+
+def test_connection_created_on_use():
+    count = len(_connections)
+    config = Config(hosts=['lazy_host'])
+    config(timeout=5)
+    config['maxsize'] = 4
+    del config['timeout']
+    assert len(_connections) == count
+    assert config.connection is connect({'hosts': ['lazy_host'], 'maxsize': 4})
+
+
+def test_connection_after_change():
+    config = Config(hosts=HOSTS)
+    connection = config.connection
+    config(timeout=5)
+    assert config.connection is not connection
+    del config['timeout']
+    assert config.connection is connection
+
+
+def test_connection_per_process(monkeypatch):
+    config = Config(hosts=HOSTS)
+    connection = config.connection
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert config.connection is not connection
+
+
+def test_connection_unpickled():
+    config = Config(hosts=HOSTS)
+    assert pickle.loads(pickle.dumps(config)).connection is config.connection
+
+
+def test_keep_alive():
+    config = Config(hosts=HOSTS, keep_alive=60, maxsize=25)
+    connection = config.connection.transport.get_connection()
+    options = connection.pool.conn_kw['socket_options']
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in options
+    assert connection.pool.pool.maxsize == 25
@@ -1,4 +1,15 @@
+import json
+import pickle
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
+import pytest
+
+from bamboo import DataFrame, ResultCache
+from bamboo.fields import Dummy, Integer
+from bamboo.partitions import Partitions
+from bamboo.queries import Bool, Terms
 
 
 def test_get_by_id(df, test_id):
@@ -105,3 +116,444 @@ def test_negative_weight(df):
     results = list(df.collect(include_score=True))
     scores = {i['_score'] for i in results}
     assert scores == {1.0, -2.0, -1.0}
+
+
+def test_compile_without_scoring(df):
+    df = df[(df.ns1.attr1 > 1) & (df.attr2 == 4)]
+    assert df._compile(scoring=False) == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'range': {'ns1.attr1': {'gt': 1}}},
+                    {'term': {'attr2': 4}}
+                ]
+            }
+        }
+    }
+    assert df._compile() == df._body
+
+
+def test_count_without_scoring_matches(df):
+    df = df[(df.ns1.attr1 > 1) | (df.attr2 == 4)]
+    assert df.count() == 4
+
+
+def test_boosted_collect_keeps_score(df):
+    df = df[(df.ns1.attr1 >= 5).boost(2)]
+    results = list(df.collect())
+    assert results
+    results = list(df.collect(include_score=True))
+    assert all([i['_score'] == 2.0 for i in results])
+
+
+def test_empty_query_skips_request(df, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('request sent')
+
+    df = df[(df.ns1.attr1 > 30) & ~(df.ns1.attr1 > 30)]
+    monkeypatch.setattr(df.config.connection, 'count', fail)
+    monkeypatch.setattr(df.config.connection, 'search', fail)
+    assert df.count() == 0
+    assert list(df.collect()) == []
+    assert df.to_pandas().empty
+    assert df.ns1.attr1.average() is None
+    assert df.ns1.attr1.sum() == 0
+    assert df.ns1.attr1.value_counts() == []
+    assert df.ns3.test_date.max() is None
+
+
+def test_nested_negation_not_empty(df):
+    condition = df.ns1.attr1 > 1
+    # not (not x and not y) is x or y, which matches documents although y matches none
+    negated = df[Bool(must_not=[Bool(must_not=[condition, df.ns1.attr1.isin([])])])]
+    assert not negated._empty
+    assert negated.count() == df[condition].count() > 0
+
+
+def test_empty_isin(df):
+    df = df[df.ns1.attr1.isin([])]
+    assert df._empty
+    assert df.count() == 0
+
+
+def test_with_options(df):
+    df = df.with_options(request_cache=True, preference='session')
+    assert df._options == {'request_cache': True, 'preference': 'session'}
+    df = df[df.ns1.attr1 > 1].with_options(routing='a')
+    assert df._options == {'request_cache': True, 'preference': 'session', 'routing': 'a'}
+
+
+def test_with_options_requests(df):
+    df = df.with_options(request_cache=True, preference='session')
+    df = df[df.ns1.attr1.exists()]
+    assert df.count() == 4
+    assert len(list(df.collect())) == 4
+    assert len(list(df.collect(limit=2))) == 2
+    assert df.ns1.attr1.nunique() == 4
+
+
+def test_assign_expression(df):
+    expression = df.ns1.attr1 * df.attr2 / 2
+    assert expression.source == \
+        "(double) (doc['ns1.attr1'].value * doc['attr2'].value) / params.p0"
+    assert expression.params == {'p0': 2}
+    assert expression.script == (
+        "if (doc['attr2'].size() != 0 && doc['ns1.attr1'].size() != 0) "
+        "{ emit((double) ((double) (doc['ns1.attr1'].value * doc['attr2'].value) / params.p0)); }"
+    )
+
+
+def test_assign_expression_constants_are_params(df):
+    expression = (df.ns1.attr1 * 2 + 3) - (4 - df.attr2)
+    assert expression.source == \
+        "((doc['ns1.attr1'].value * params.p0) + params.p1) - (params.p2 - doc['attr2'].value)"
+    assert expression.params == {'p0': 2, 'p1': 3, 'p2': 4}
+    # expressions differing only in constants compile to the same script
+    assert (df.ns1.attr1 * 5).script == (df.ns1.attr1 * 2).script
+    assigned = df.assign(double=df.ns1.attr1 * 2)
+    assert assigned._runtime['double']['script']['params'] == {'p0': 2}
+
+
+def test_assign(df):
+    assigned = df.assign(total=df.ns1.attr1 * df.attr2)
+    assert assigned.dtypes['total'] == 'float'
+    assert not hasattr(df, 'total')
+    assigned = assigned[assigned.total > 10]
+    assert assigned._body == {
+        'query': {
+            'range': {
+                'total': {
+                    'gt': 10
+                }
+            }
+        },
+        'runtime_mappings': {
+            'total': {
+                'type': 'double',
+                'script': {
+                    'lang': 'painless',
+                    'source': "if (doc['attr2'].size() != 0 && doc['ns1.attr1'].size() != 0) "
+                              "{ emit((double) (doc['ns1.attr1'].value * doc['attr2'].value)); }"
+                }
+            }
+        }
+    }
+
+
+def test_isin_unique_sorted(df):
+    df = df[df.ns1.attr1.isin([10, 1, 10, 5])]
+    assert df._body == {'query': {'terms': {'ns1.attr1': [1, 5, 10]}}}
+
+
+def test_isin_array(df):
+    values = np.array([10, 1, 10])
+    assert df[df.ns1.attr1.isin(values)]._body == {'query': {'terms': {'ns1.attr1': [1, 10]}}}
+    assert df[df.ns1.attr1.isin(pd.Series(values))]._body == \
+        {'query': {'terms': {'ns1.attr1': [1, 10]}}}
+
+
+def test_isin_chunked(df, monkeypatch):
+    monkeypatch.setattr(Terms, 'max_terms', 2)
+    df = df[df.ns1.attr1.isin([10, 5, 1, 99])]
+    assert df._body == {
+        'query': {
+            'bool': {
+                'should': [
+                    {'terms': {'ns1.attr1': [1, 5]}},
+                    {'terms': {'ns1.attr1': [10, 99]}}
+                ]
+            }
+        }
+    }
+    assert df.count() == 4
+    assert len(list(df.collect())) == 4
+    assert df.ns1.attr1.value_counts() == [(5, 2), (1, 1), (10, 1)]
+
+
+def test_isin_lookup_body(df):
+    df = df[df.ns1.attr1.isin_lookup('lookups', 'blocklist')]
+    assert df._body == {
+        'query': {
+            'terms': {
+                'ns1.attr1': {
+                    'index': 'lookups',
+                    'id': 'blocklist',
+                    'path': 'values'
+                }
+            }
+        }
+    }
+
+
+def test_isin_lookup(df, monkeypatch):
+    monkeypatch.setattr(Terms, 'max_terms', 2)
+    index = 'bamboo-test-lookup-'
+    ids = df.store_lookup(index, 'attr1', [10, 5, 99])
+    try:
+        assert ids == ['attr1-0', 'attr1-1']
+        assert df[df.ns1.attr1.isin_lookup(index, ids, doc_type='doc')].count() == 3
+        # a smaller set stored again under the id replaces every chunk
+        ids = df.store_lookup(index, 'attr1', [10])
+        assert ids == ['attr1']
+        assert df._es.count(index=index)['count'] == 1
+        assert df[df.ns1.attr1.isin_lookup(index, ids, doc_type='doc')].count() == 1
+    finally:
+        df._es.indices.delete(index=index)
+
+
+def test_merge(df):
+    left = df[df.ns1.attr1.exists()]
+    rows = list(left.merge(df, on='ns1.attr1', batch_size=2))
+    assert len(rows) == 6
+    assert sorted(i['ns1.attr1'] for i in rows) == [1, 5, 5, 5, 5, 10]
+    assert {'attr2_x', 'attr2_y'} <= set().union(*rows)
+
+
+def test_merge_left_right_on(df):
+    left = df[df.attr2 == 4]
+    rows = list(left.merge(df, left_on='attr2', right_on='ns1.attr1'))
+    assert rows == []
+    rows = list(left.merge(df, left_on='ns1.attr1', right_on='ns1.attr1'))
+    assert len(rows) == 1
+
+
+def test_merge_requires_keys(df):
+    with pytest.raises(ValueError):
+        df.merge(df)
+
+
+def test_index_pattern_merges_mappings(df):
+    index = 'bamboo-test-index-conflict'
+    df._es.indices.create(index=index, body={
+        'mappings': {'doc': {'properties': {
+            'ns1': {'properties': {'attr1': {'type': 'keyword'}}},
+            'extra': {'type': 'integer'}
+        }}}
+    })
+    try:
+        with pytest.warns(UserWarning):
+            merged = DataFrame('bamboo-test-index-*')
+        assert isinstance(merged.extra, Integer)
+        assert isinstance(merged.ns1.attr1, Dummy)
+        assert merged.mapping_conflicts == {
+            'ns1.attr1': {'bamboo-test-index-': 'integer', index: 'keyword'}
+        }
+        assert df.mapping_conflicts == {}
+    finally:
+        df._es.indices.delete(index=index)
+
+
+def test_partition_by(df):
+    partitioned = df.partition_by('ns3.test_date')
+    assert partitioned._options == {'pre_filter_shard_size': 1}
+    condition = partitioned.ns3.test_date < datetime(2019, 7, 10)
+    assert partitioned[condition].count() == 2
+    assert len(list(partitioned[condition].collect())) == 2
+
+
+def test_partition_by_prunes_indices(df, monkeypatch):
+    indices = ['logs-2019.06.30', 'logs-2019.07.01', 'logs-2019.07.02', 'other']
+    monkeypatch.setattr(Partitions, 'indices', lambda self, es, index: indices)
+    df = df.partition_by('ns3.test_date', index_format='logs-%Y.%m.%d')
+    assert df._indices == df.index
+    df = df[df.ns3.test_date >= datetime(2019, 7, 2, 12)]
+    assert df._indices == 'logs-2019.07.01,logs-2019.07.02,other'
+
+
+def test_sort_values_head(df):
+    results = df.sort_values('ns4.attr4', ascending=False).head(2).collect()
+    assert [i['ns4']['attr4'] for i in results] == [120.0, 85.5]
+    results = df.sort_values(['ns1.attr1', 'attr2'], ascending=[True, False]).head(3).take(3)
+    assert [i['ns1']['attr1'] for i in results] == [1, 5, 5]
+
+
+def test_sort_values_requires_ascending_per_field(df):
+    with pytest.raises(ValueError):
+        df.sort_values(['ns1.attr1', 'attr2'], ascending=[True])
+
+
+def test_tail(df):
+    df = df[df.ns4.attr4.exists()].sort_values('ns4.attr4')
+    assert df.tail(2)._sort == [{'ns4.attr4': 'desc'}]
+    assert [i['ns4']['attr4'] for i in df.tail(2).collect()] == [85.5, 120.0]
+    with pytest.raises(ValueError):
+        df.sort_values([]).tail(2)
+
+
+def test_head_tail_limits(df):
+    df = df.sort_values('ns4.attr4')
+    assert df.head(10).head(3)._limit == 3
+    assert df.head(3).head(10)._limit == 3
+    tail = df.tail(10).tail(3)
+    assert (tail._limit, tail._sort, tail._reversed) == (3, [{'ns4.attr4': 'desc'}], True)
+    assert df.tail(3).head(10)._limit == 3
+    with pytest.raises(ValueError):
+        df.head(10).tail(3)
+    with pytest.raises(ValueError):
+        df.tail(10).head(3)
+
+
+def test_nlargest_nsmallest(df):
+    assert [i['ns4']['attr4'] for i in df.nlargest(3, 'ns4.attr4').collect()] == [120.0, 85.5, 75.5]
+    assert [i['ns4']['attr4'] for i in df.nsmallest(2, 'ns4.attr4').collect()] == [2.0, 75.5]
+    with pytest.raises(TypeError):
+        df.nlargest(3, 'ns2.os')
+
+
+def test_sort_values_search_after(df, monkeypatch):
+    sizes = []
+    search = df.config.connection.search
+
+    def record(**params):
+        sizes.append(params['size'])
+        return search(**params)
+
+    monkeypatch.setattr(df.config.connection, 'search', record)
+    monkeypatch.setattr(df, 'max_result_window', 2)
+    results = list(df.nlargest(5, 'ns4.attr4').collect())
+    assert [i['ns4']['attr4'] for i in results] == [120.0, 85.5, 75.5, 2.0]
+    assert sizes == [2, 2, 1]
+
+
+def test_sample_body(df):
+    df = df[df.ns1.attr1 > 1].sample(3, seed=42)
+    assert df._compile(scoring=False) == {
+        'query': {
+            'function_score': {
+                'query': {'bool': {'filter': [{'range': {'ns1.attr1': {'gt': 1}}}]}},
+                'random_score': {'seed': 42, 'field': '_seq_no'},
+                'boost_mode': 'replace'
+            }
+        }
+    }
+    with pytest.raises(ValueError):
+        df.sample(n=1, frac=0.5)
+    with pytest.raises(ValueError):
+        df.sort_values('ns1.attr1')
+
+
+def test_sample(df):
+    sample = df.sample(3, seed=42)
+    assert sample.count() == 3
+    results = list(sample.collect(include_id=True))
+    assert len(results) == 3
+    assert [i['_id'] for i in sample.collect(include_id=True)] == [i['_id'] for i in results]
+    assert len(df.sample(100).take(5)) == 5
+    assert df.sample(100).count() == 17
+    assert df[df.ns1.attr1.exists()].sample(frac=0.5).count() == 2
+    assert df.sample(frac=1.0).count() == df.count()
+
+
+def test_sample_paged_with_one_seed(df, monkeypatch):
+    bodies = []
+    search = df.config.connection.search
+
+    def record(**kwargs):
+        bodies.append(kwargs['body'])
+        return search(**kwargs)
+
+    monkeypatch.setattr(df.config.connection, 'search', record)
+    monkeypatch.setattr(df, 'max_result_window', 2)
+    sample = df.sample(5)
+    results = list(sample.collect(include_id=True))
+    seeds = {i['query']['function_score']['random_score'].get('seed') for i in bodies}
+    assert len(seeds) == 1 and None not in seeds
+    assert len({i['_id'] for i in results}) == len(results) == 5
+    assert sample._sample['seed'] is None
+
+
+def test_sample_aggregation(df):
+    sample = df[df.ns4.attr4.exists()].sample(2, seed=1)
+    assert 2.0 <= sample.ns4.attr4.average() <= 120.0
+    assert sample.ns4.attr4.max() <= 120.0
+
+
+def test_export(df, tmpdir):
+    path = str(tmpdir.join('export.jsonl'))
+    assert df.export(path, page_size=5) == 17
+    with open(path) as f:
+        docs = [json.loads(i) for i in f]
+    assert len(docs) == 17
+    assert {'ns1': {'attr1': 10}, 'attr2': 4} in docs
+    df = df[df.ns1.attr1.exists()].sort_values('ns1.attr1', ascending=False)
+    assert df.export(path, fields=['ns1.attr1']) == 4
+    with open(path) as f:
+        assert [json.loads(i)['ns1']['attr1'] for i in f] == [10, 5, 5, 1]
+
+
+def test_export_resumes_from_checkpoint(df, tmpdir, monkeypatch):
+    path = str(tmpdir.join('export.jsonl'))
+    checkpoint = str(tmpdir.join('export.checkpoint'))
+    search = df.config.connection.search
+    calls = []
+
+    def crash(**kwargs):
+        calls.append(kwargs['body'].get('search_after'))
+        if len(calls) == 4:
+            raise RuntimeError('crash')
+        return search(**kwargs)
+
+    monkeypatch.setattr(df.config.connection, 'search', crash)
+    with pytest.raises(RuntimeError):
+        df.export(path, checkpoint=checkpoint, page_size=3, checkpoint_every=2)
+    with open(checkpoint) as f:
+        assert json.load(f)['count'] == 6
+    with open(path) as f:
+        assert len(f.readlines()) == 9  # written after the last checkpoint
+    monkeypatch.setattr(df.config.connection, 'search', search)
+    assert df.export(path, checkpoint=checkpoint, page_size=3, checkpoint_every=2) == 17
+    assert not tmpdir.join('export.checkpoint').exists()
+    with open(path) as f:
+        docs = [json.loads(i) for i in f]
+    assert len(docs) == 17
+    assert len(set(json.dumps(i, sort_keys=True) for i in docs)) == 16  # two identical sources
+    with pytest.raises(ValueError):
+        with open(checkpoint, 'w') as f:
+            json.dump({'request': 'other'}, f)
+        df.export(path, checkpoint=checkpoint)
+
+
+def test_export_bypasses_cache(df, tmpdir, monkeypatch):
+    cache = ResultCache()
+    df = DataFrame(df.index, cache=cache)
+    bodies = []
+    search = df.config.connection.search
+
+    def record(**kwargs):
+        bodies.append(kwargs['body'])
+        return search(**kwargs)
+
+    monkeypatch.setattr(df.config.connection, 'search', record)
+    monkeypatch.setattr(df, 'tiebreaker', 'ns2.os')
+    df.export(str(tmpdir.join('export.jsonl')), page_size=100)
+    assert bodies and all(i['sort'] == [{'ns2.os': 'asc'}] for i in bodies)
+    assert len(cache) == 0 and cache.stats['misses'] == 0
+
+
+def test_partitions(df):
+    df = df[df.ns1.attr1.exists()]
+    slices = df.partitions(3, fields=['ns1.attr1'])
+    assert [(i.id, i.max) for i in slices] == [(0, 3), (1, 3), (2, 3)]
+    slices = [pickle.loads(pickle.dumps(i)) for i in slices]
+    assert len(pickle.dumps(slices[0])) < 1024
+    assert slices[0].body == df._compile(scoring=False)
+    values = [doc['ns1']['attr1'] for i in slices for doc in i.collect()]
+    assert sorted(values) == [1, 5, 5, 10]
+    assert pd.concat(i.to_pandas() for i in slices)['ns1.attr1'].sum() == 21
+
+
+def test_to_dask(df):
+    pytest.importorskip('dask.dataframe')
+    ddf = df[df.ns1.attr1.exists()].to_dask(2, fields=['ns1.attr1'])
+    assert ddf.npartitions == 2
+    assert ddf['ns1.attr1'].sum().compute() == 21
+
+
+def test_to_pandas_processes(df):
+    df = df[df.ns1.attr1.exists()]
+    frame = df.to_pandas(processes=2)
+    assert sorted(frame['ns1.attr1']) == [1, 5, 5, 10]
+    frame = df.sort_values('ns1.attr1', ascending=False).to_pandas(processes=2)
+    assert list(frame['ns1.attr1']) == [10, 5, 5, 1]
+    with pytest.raises(ValueError):
+        df.limit(2).to_pandas(processes=2)
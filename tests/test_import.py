@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# seconds `import bamboo` may take, well above its usual time
+IMPORT_BUDGET = 0.25
+HEAVY_MODULES = ('elasticsearch', 'urllib3', 'pandas', 'numpy', 'pkg_resources')
+
+
+def _run(code, *options):
+    """Run code in a new interpreter and get its stdout and stderr."""
+    process = subprocess.Popen([sys.executable] + list(options) + ['-c', code],
+                               cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    out, err = process.communicate()
+    assert process.returncode == 0, err
+    return out, err
+
+
+def _import_times(stderr):
+    """Parse the cumulative import time in seconds of each module."""
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime requires python 3.7')
+def test_import_time():
+    times = _import_times(_run('import bamboo', '-X', 'importtime')[1])
+    assert times['bamboo'] < IMPORT_BUDGET
+
+
+def test_import_is_lazy():
+    code = ('import sys, bamboo\n'
+            'print(" ".join(sorted(i.split(".")[0] for i in sys.modules)))')
+    modules = _run(code)[0].split()
+    assert not [i for i in HEAVY_MODULES if i in modules]
+
+
+def test_import_creates_no_client():
+    code = ('import sys, bamboo\n'
+            'print(len(sys.modules["bamboo.config"]._connections))')
+    assert _run(code)[0].strip() == '0'
@@ -0,0 +1,218 @@
+import operator
+
+import pytest
+
+from bamboo.queries import Bool, Exists, Range, Term, Terms
+from conftest import TEST_DATA
+
+# conditions from test_query_generation
+CASES = {
+    'different_dtypes': lambda df: df[df.ns1.attr1 > 5][df.ns2.os == 'android'],
+    'multiple_numeric': lambda df: df[df.ns1.attr1 > 5][df.ns4.attr4 == 9][df.ns1.attr2 == 6.0],
+    'chained_invert': lambda df: df[df.ns1.attr1 > 5][df.ns4.attr4 == 9][df.ns1.attr2 != 6.0],
+    'chained_invert_3': lambda df: ~df[df.ns1.attr1 > 5][df.ns4.attr4 == 9][df.ns1.attr2 == 6.0],
+    'or_condition': lambda df: df[(df.ns1.attr1 == 5) | (df.ns1.attr2 == 8.0)],
+    'and_condition': lambda df: df[(df.ns1.attr1 == 5) & (df.ns1.attr2 == 8.0)],
+    'nested_outer_or': lambda df: (df[df.ns1.attr1 == 5] & df[df.ns1.attr2 == 8.0])
+    | (df[df.ns2.attr3 == True] & df[df.attr2 == 6]),
+    'nested_outer_and': lambda df: (df[df.ns1.attr1 == 5] | df[df.ns1.attr2 == 8.0])
+    & (df[df.ns2.attr3 == True] | df[df.attr2 == 6]),
+    'chained_inner_or': lambda df: df[(df.ns1.attr1 == 5) | (df.ns1.attr2 == 8.0)]
+    [(df.ns2.attr3 == True) | (df.attr2 == 6)],
+    'invert_or': lambda df: ~df[(df.ns1.attr1 == 5) | (df.ns1.attr2 == 8.0)],
+    'invert_and': lambda df: ~df[(df.ns1.attr1 == 5) & (df.ns1.attr2 == 8.0)],
+    'double_invert_and': lambda df: df[~(df.ns1.attr1 == 9) & ~(df.ns1.attr2 == 5.0)],
+    'double_invert_or': lambda df: df[~(df.ns1.attr1 == 9) | ~(df.ns1.attr2 == 5.0)],
+    'invert_invert_and': lambda df: ~df[~(df.ns1.attr1 == 9) & ~(df.ns1.attr2 == 5.0)],
+    'nested_invert': lambda df: df[(df.ns1.attr1 == 9) & ~(df.ns1.attr2 == 5.0)],
+    'nested_invert_or': lambda df: df[(df.ns1.attr1 == 9) | ~(df.ns1.attr2 == 5.0)],
+    'double_negative': lambda df: ~df[df.ns1.attr1 != 5],
+    'deeply_nested': lambda df: df[(df.ns1.attr1 > 1) | ((df.attr2 == 4)
+                                   & ((df.ns4.attr4 < 80) | ~df.ns1.attr2.exists()))],
+    'deeply_nested_2': lambda df: df[(df.ns1.attr1 > 1) & ((df.attr2 == 4)
+                                     | ((df.ns4.attr4 < 80) & ~df.ns1.attr2.exists()))],
+    'isin': lambda df: df[df.ns1.attr1.isin([1, 10])],
+    'filter_plus_conditions': lambda df: df[df.ns1.attr1 == 5].filter(df.ns1.attr2 == 8.0),
+    'outer_invert_filter': lambda df: ~df.filter(df.ns1.attr1 == 5),
+    'inner_invert_filter': lambda df: df.filter(~df.ns1.attr1 == 5),
+    'filtered_or': lambda df: df.filter((df.ns1.attr1 == 5) | (df.ns1.attr2 == 8.0)),
+    'and_filter': lambda df: df.filter(df.ns1.attr1 == 5) & df.filter(df.ns1.attr2 == 8.0),
+    'or_filter': lambda df: df.filter(df.ns1.attr1 == 5) | df.filter(df.ns1.attr2 == 8.0),
+    'merged_ranges': lambda df: df[(df.ns4.attr4 > 2) & (df.ns4.attr4 <= 85.5)
+                                   & (df.ns4.attr4 >= 50)],
+    'disjoint_ranges': lambda df: df[(df.ns4.attr4 > 100) & (df.ns4.attr4 < 50)],
+    'folded_terms': lambda df: df[(df.ns1.attr1 == 1) | (df.ns1.attr1 == 5)
+                                  | df.ns1.attr1.isin([10, 5])],
+    'negated_terms': lambda df: df[(df.ns1.attr1 != 1) & (df.ns1.attr1 != 5)],
+}
+
+
+# documents with several values per field, where each condition on a
+# field may match a different value
+MULTI_VALUED = [
+    {'ns1': {'attr1': [1, 10], 'attr2': [5.0, 8.0]}, 'ns4': {'attr4': [1, 90]}},
+    {'ns1': {'attr1': [5, 9]}, 'ns4': {'attr4': [40, 101]}, 'attr2': [4, 6]},
+    {'ns1': {'attr1': [1, 5], 'attr2': [6.0]}, 'ns2': {'os': ['ios', 'android'], 'attr3': [True]}},
+]
+
+
+def _get(doc, field):
+    for name in field.split('.'):
+        if not isinstance(doc, dict) or name not in doc:
+            return None
+        doc = doc[name]
+    return doc
+
+
+def _matches(doc, query):
+    """Evaluate a query body against a document source."""
+    (key, body), = query.items()
+    if key == 'match_all':
+        return True
+    if key == 'bool':
+        required = body.get('must', []) + body.get('filter', [])
+        should = body.get('should', [])
+        return (all(_matches(doc, i) for i in required)
+                and not any(_matches(doc, i) for i in body.get('must_not', []))
+                and (required or not should or any(_matches(doc, i) for i in should)))
+    if key == 'exists':
+        return _get(doc, body['field']) is not None
+    (field, value), = ((k, v) for k, v in body.items() if k != 'boost')
+    actual = _get(doc, field)
+    if actual is None:
+        return False
+    # a condition matches a field with several values if any value matches
+    values = actual if isinstance(actual, list) else [actual]
+    return any(_compare(key, i, value) for i in values)
+
+
+def _compare(key, actual, value):
+    """Evaluate a leaf query against a single value."""
+    if key == 'term':
+        return actual == value
+    if key == 'terms':
+        return actual in value
+    if key == 'range':
+        ops = {'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+        return all(ops[op](actual, v) for op, v in value.items() if op != 'boost')
+    raise NotImplementedError(key)
+
+
+def _evaluate(body, docs=None):
+    if docs is None:
+        docs = [i['_source'] for i in TEST_DATA]
+    return [i for i, doc in enumerate(docs) if _matches(doc, body['query'])]
+
+
+def _ids(df, body):
+    return sorted(i['_id'] for i in df.execute(body))
+
+
+@pytest.fixture(params=sorted(CASES))
+def case(request, df):
+    return CASES[request.param](df)
+
+
+def test_optimized_matches_same_documents(case):
+    assert _evaluate(case._compile()) == _evaluate(case._body)
+
+
+def test_optimized_matches_same_multi_valued_documents(case):
+    assert _evaluate(case._compile(), MULTI_VALUED) == _evaluate(case._body, MULTI_VALUED)
+
+
+def test_optimized_matches_same_documents_in_index(case):
+    assert _ids(case, case._compile()) == _ids(case, case._body)
+
+
+def test_flatten_nested_bool():
+    query = Bool(must=[Bool(must_not=[Term('a', 1)]), Bool(should=[Term('b', 1), Term('c', 1)])])
+    assert query.optimize() == Bool(must_not=[Term('a', 1)], should=[Term('b', 1), Term('c', 1)])
+
+
+def test_flatten_nested_must():
+    query = Bool(must=[Bool(must=[Term('a', 1)], filter=[Term('b', 1)]), Term('c', 1)])
+    assert query.optimize() == Bool(must=[Term('a', 1), Term('c', 1)], filter=[Term('b', 1)])
+
+
+def test_flatten_nested_filter():
+    query = Bool(filter=[Bool(must=[Term('a', 1)], must_not=[Term('b', 1)])])
+    assert query.optimize() == Bool(filter=[Term('a', 1)], must_not=[Term('b', 1)])
+
+
+def test_flatten_double_negation():
+    query = Bool(must_not=[Bool(must_not=[Term('a', 1)])])
+    assert query.optimize() == Bool(filter=[Term('a', 1)])
+
+
+def test_no_flatten_negated_conjunction_of_negations():
+    query = Bool(must_not=[Bool(must_not=[Term('a', 1), Term('b', 1)])])
+    docs = [{'a': 1}, {'b': 1}, {'a': 1, 'b': 1}, {'a': 2}]
+    assert query.optimize() == query
+    assert _evaluate({'query': query.optimize()()}, docs) == [0, 1, 2]
+
+
+def test_no_flatten_when_should_becomes_required():
+    query = Bool(must=[Bool(must_not=[Term('a', 1)])], should=[Term('b', 1)])
+    assert query.optimize() == query
+
+
+def test_no_flatten_when_should_becomes_optional():
+    query = Bool(must_not=[Bool(must_not=[Term('a', 1)])], should=[Term('b', 1)])
+    assert query.optimize() == query
+
+
+def test_no_flatten_boosted_bool():
+    query = Bool(must=[Bool(must=[Term('a', 1), Term('b', 1)], boost=2), Term('c', 1)])
+    assert query.optimize() == query
+
+
+def test_no_merge_ranges():
+    query = Range('a').greater_than(30) & Range('a').less_than(20)
+    assert query.optimize() == query
+    assert _matches({'a': [10, 40]}, query.optimize()())
+
+
+def test_no_merge_negated_ranges():
+    query = ~Range('a').greater_than(5) & ~Range('a').less_than(1)
+    assert query.optimize() == Bool(must_not=[Range('a').greater_than(5), Range('a').less_than(1)])
+
+
+def test_fold_empty_terms():
+    query = Bool(should=[Terms('a', []), Bool(must=[Terms('a', [])])])
+    assert query.optimize() == Terms('a', [])
+    assert query.optimize().empty
+
+
+def test_fold_terms():
+    query = Term('a', 1) | Term('a', 2) | Term('b', 1) | Terms('a', [2, 3])
+    assert query.optimize() == Bool(should=[Terms('a', [1, 2, 3]), Term('b', 1)])
+
+
+def test_no_fold_boosted_terms():
+    query = Term('a', 1).boost(2) | Term('a', 2)
+    assert query.optimize() == query
+
+
+def test_no_fold_required_terms():
+    query = Term('a', 1) & Term('a', 2)
+    assert query.optimize() == query
+
+
+def test_optimize_is_memoized():
+    query = Bool(must=[Bool(must_not=[Exists('a')]), Term('b', 1)])
+    assert query.optimize() is query.optimize()
+
+
+def test_filter_context_matches_same_documents(case):
+    assert _evaluate(case._compile(scoring=False)) == _evaluate(case._body)
+
+
+def test_filter_context_counts_same_documents_in_index(case):
+    assert _ids(case, case._compile(scoring=False)) == _ids(case, case._body)
+
+
+def test_fold_terms_chunked(monkeypatch):
+    monkeypatch.setattr(Terms, 'max_terms', 2)
+    query = Terms('a', [1, 2]) | Terms('a', [3]) | Term('a', 4) | Term('a', 5)
+    assert query.optimize() == Bool(should=[Terms('a', [1, 2]), Terms('a', [3, 4]), Terms('a', [5])])
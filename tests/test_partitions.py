@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bamboo.partitions import Partitions, _to_datetime, bounds
+from bamboo.queries import Bool, Range, Term
+
+DAY = timedelta(days=1)
+
+
+def test_period_from_format():
+    assert Partitions('ts', 'logs-%Y.%m.%d').period == DAY
+    assert Partitions('ts', 'logs-%Y.%m').period == timedelta(days=31)
+    assert Partitions('ts').period is None
+    with pytest.raises(ValueError):
+        Partitions('ts', 'logs')
+
+
+def test_bounds():
+    query = Range('ts').greater_than_or_equal(datetime(2019, 7, 2)) & Term('a', 1)
+    assert bounds(query, 'ts') == (datetime(2019, 7, 1), None)
+    query = Range('ts').less_than(datetime(2019, 7, 2))
+    assert bounds(query, 'ts') == (None, datetime(2019, 7, 3))
+    assert bounds(query, 'other') == (None, None)
+
+
+def test_bounds_ignores_optional_clauses():
+    query = Range('ts').less_than(datetime(2019, 7, 2)) | Term('a', 1)
+    assert bounds(query, 'ts') == (None, None)
+    query = Bool(must_not=[Range('ts').less_than(datetime(2019, 7, 2))])
+    assert bounds(query, 'ts') == (None, None)
+
+
+def test_bounds_intersect():
+    query = Bool(filter=[Range('ts').greater_than(datetime(2019, 7, 2)),
+                         Range('ts').greater_than(datetime(2019, 7, 5))])
+    assert bounds(query, 'ts') == (datetime(2019, 7, 4), None)
+
+
+def test_to_datetime():
+    assert _to_datetime(0) == (datetime(1970, 1, 1), timedelta(0))
+    assert _to_datetime('2019-07-15T11:35:55.713594') == (datetime(2019, 7, 15, 11, 35, 55, 713594), DAY)
+    assert _to_datetime('2019-07-15||+1d/d') == (datetime(2019, 7, 16), 2 * DAY)
+    assert _to_datetime('not a date') is None
+    value, slack = _to_datetime('now-10d/d')
+    assert abs(value - (datetime.utcnow() - 10 * DAY)) < timedelta(minutes=1)
+    assert slack == 2 * DAY
+
+
+def test_prune():
+    partitions = Partitions('ts', 'logs-%Y.%m.%d')
+    indices = ['logs-2019.06.29', 'logs-2019.06.30', 'logs-2019.07.01',
+               'logs-2019.07.02', 'logs-2019.07.03', 'other']
+    query = (Range('ts').greater_than_or_equal(datetime(2019, 7, 1))
+             & Range('ts').less_than(datetime(2019, 7, 2)))
+    assert partitions.prune(indices, query) == indices[1:]
+    assert partitions.prune(indices, Term('a', 1)) == indices
+
+
+def test_indices_cached():
+    class Indices(object):
+        calls = 0
+
+        def get_alias(self, index):
+            self.calls += 1
+            return {'logs-2019.07.02': {}, 'logs-2019.07.01': {}}
+
+    class Client(object):
+        indices = Indices()
+
+    partitions = Partitions('ts', 'logs-%Y.%m.%d', refresh_interval=60)
+    assert partitions.indices(Client, 'logs-*') == ['logs-2019.07.01', 'logs-2019.07.02']
+    assert partitions.indices(Client, 'logs-*') == ['logs-2019.07.01', 'logs-2019.07.02']
+    assert Client.indices.calls == 1
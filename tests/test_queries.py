@@ -0,0 +1,188 @@
+import json
+import pickle
+from copy import deepcopy
+
+import pytest
+
+from bamboo.queries import Bool, Exists, Range, Script, Term, Terms
+from bamboo.serializer import Compiled, Serializer
+
+
+def test_compiled_query_is_memoized():
+    query = Bool(must=[Term('attr', 1), Range('attr2').greater_than(5)])
+    assert query() is query()
+    assert isinstance(query(), Compiled)
+
+
+def test_query_is_immutable():
+    query = Term('attr', 1)
+    with pytest.raises(AttributeError):
+        query.value = 2
+    assert deepcopy(query) is query
+
+
+def test_compiled_query_is_read_only():
+    body = Term('attr', 1)()
+    with pytest.raises(TypeError):
+        body['term'] = {}
+    with pytest.raises(TypeError):
+        body.update({})
+
+
+def test_operations_return_new_query():
+    query = Range('attr').greater_than(5)
+    bounded = query.less_than(10)
+    boosted = bounded.boost(2)
+    assert query() == {'range': {'attr': {'gt': 5}}}
+    assert bounded() == {'range': {'attr': {'gt': 5, 'lt': 10}}}
+    assert boosted() == {'range': {'attr': {'gt': 5, 'lt': 10, 'boost': 2}}}
+
+
+def test_explode_does_not_alter_query():
+    query = Bool(must=Term('attr', 1), should=Term('attr', 2))
+    body = query()
+    query & Exists('attr')
+    assert query() == body
+    assert query.must == [Term('attr', 1)]
+
+
+def test_serializer_reuses_compiled_json():
+    query = Bool(must=[Term('attr', 1)], must_not=[Exists('attr2')])
+    body = {'query': query(), 'size': 0, 'sort': '_doc'}
+    raw = Serializer().dumps(body)
+    assert query().json in raw
+    assert json.loads(raw) == json.loads(json.dumps(body))
+
+
+def test_serializer_compiled_body(df):
+    df = df[(df.ns1.attr1 > 5) & (df.ns2.os == 'mac')]
+    body = df._body
+    assert Serializer().dumps(body['query']) is body['query'].json
+
+
+def test_structural_equality():
+    assert Term('attr', 1) == Term('attr', 1)
+    assert Term('attr', 1) != Term('attr', 2)
+    assert Term('attr', 1) != Term('attr', True)
+    assert Term('attr', 1) != Terms('attr', 1)
+    assert Terms('attr', [1, 2]) == Terms('attr', (1, 2))
+    assert Term('attr', 1).boost(2) != Term('attr', 1)
+
+
+def test_range_equality_ignores_operator_order():
+    query = Range('attr').greater_than(5).less_than(10)
+    other = Range('attr').less_than(10).greater_than(5)
+    assert query == other
+    assert hash(query) == hash(other)
+    assert query.fingerprint == other.fingerprint
+
+
+def test_structurally_equal_queries_are_interned():
+    query = (Term('attr', 1) & Exists('attr2')) | ~Range('attr').less_than(5)
+    other = (Term('attr', 1) & Exists('attr2')) | ~Range('attr').less_than(5)
+    assert query is other
+
+
+def test_bool_drops_duplicate_clauses():
+    query = Bool(must=[Term('attr', 1), Exists('attr2'), Term('attr', 1)])
+    assert query.must == [Term('attr', 1), Exists('attr2')]
+    assert query() == {
+        'bool': {
+            'must': [
+                {'term': {'attr': 1}},
+                {'exists': {'field': 'attr2'}}
+            ]
+        }
+    }
+
+
+def test_fingerprint():
+    query = Bool(must=[Term('attr', 1)], should=[Exists('attr2')])
+    assert query.fingerprint == Bool(must=[Term('attr', 1)], should=[Exists('attr2')]).fingerprint
+    assert query.fingerprint != Bool(must=[Term('attr', 2)], should=[Exists('attr2')]).fingerprint
+
+
+def test_pickle_query():
+    query = Bool(must=[Term('attr', 1)], must_not=[Range('attr2').less_than(5)])
+    other = pickle.loads(pickle.dumps(query))
+    assert other == query
+    assert other() == query()
+
+
+def test_filter_context():
+    query = Term('attr', 1)
+    assert query.filter_context() == Bool(filter=[query])
+
+
+def test_bool_filter_context():
+    query = Bool(must=[Term('attr', 1)], filter=[Exists('attr2')],
+                 must_not=[Term('attr', 2)], should=[Term('attr3', 1)])
+    assert query.filter_context()() == {
+        'bool': {
+            'filter': [{'term': {'attr': 1}}, {'exists': {'field': 'attr2'}}],
+            'must_not': [{'term': {'attr': 2}}]
+        }
+    }
+
+
+def test_bool_filter_context_required_should():
+    query = Term('attr', 1) | Term('attr2', 1)
+    assert query.filter_context() == Bool(filter=[query])
+
+
+def test_boosted():
+    assert Term('attr', 1).boost(2).boosted
+    assert not Term('attr', 1).boosted
+    assert (Term('attr', 1) & ~Term('attr2', 1).boost(2)).boosted
+    assert not (Term('attr', 1) & ~Term('attr2', 1)).boosted
+
+
+def test_empty_range():
+    assert Range('attr').greater_than(30).less_than_or_equal(30).empty
+    assert not Range('attr').greater_than_or_equal(30).less_than_or_equal(30).empty
+    assert not (Range('attr').greater_than(20) & Range('attr').less_than(30)).optimize().empty
+    # a field with several values may match each range with a different value
+    assert not (Range('attr').greater_than(30) & Range('attr').less_than(20)).optimize().empty
+
+
+def test_empty_terms():
+    assert Terms('attr', []).empty
+    assert (Term('attr', 1) & Terms('attr', [])).empty
+    assert (Terms('attr', []) | Terms('attr2', [])).empty
+    assert not (Term('attr', 1) | Terms('attr', [])).empty
+    assert not (~Terms('attr', [])).empty
+
+
+def test_not_empty_different_values():
+    # fields may hold several values, and differently written values may be equal
+    assert not (Term('tags', 'a') & Term('tags', 'b')).empty
+    assert not (Term('attr', 1) & Terms('attr', [2, 3])).empty
+    assert not (Term('attr', 5) & Range('attr').greater_than(6)).empty
+    assert not (Term('date', '2019-07-01') & Term('date', '2019-07-01T00:00:00')).empty
+
+
+def test_empty_negated():
+    assert (Term('attr', 1) & ~Term('attr', 1)).optimize().empty
+    assert (Term('attr', 1) & ~Exists('attr')).optimize().empty
+    assert not (Term('attr', 1) & ~Exists('attr2')).optimize().empty
+
+
+def test_range_time_zone():
+    query = Range('a', time_zone='+01:00').less_than('now-1d/d')
+    assert query() == {'range': {'a': {'lt': 'now-1d/d', 'time_zone': '+01:00'}}}
+    assert query != Range('a').less_than('now-1d/d')
+
+
+def test_script_params():
+    query = Script('params.a > 1', params={'a': 1})
+    assert query == Script('params.a > 1', params={'a': 1})
+    assert query != Script('params.a > 1', params={'a': 2})
+    assert query()['script']['script']['params'] == {'a': 1}
+
+
+def test_script_source_or_id():
+    with pytest.raises(ValueError):
+        Script()
+    with pytest.raises(ValueError):
+        Script('params.a > 1', id='script')
+    assert Script(id='script')() == {'script': {'script': {'id': 'script'}}}
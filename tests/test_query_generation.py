@@ -1,5 +1,3 @@
-from datetime import date, timedelta
-
 import pytest
 
 from bamboo import BadOperatorError, boost
@@ -697,14 +695,67 @@ def test_bad_operator(df):
 def test_age_query(df):
     days = 10
     df = df[df.ns3.test_date.age >= days]
-    # direct access for rounding
-    dt = df._body['query']['range']['ns3.test_date']['lte']
-    expected = date.today() - timedelta(days=days)
-    assert dt.date() == expected
+    assert df._body == {
+        'query': {
+            'range': {
+                'ns3.test_date': {
+                    'lte': 'now-10d/d'
+                }
+            }
+        }
+    }
     matches = list(df.collect())
     assert len(matches) == 3
 
 
+def test_age_query_equal(df):
+    df = df[df.ns3.test_date.age == 10]
+    assert df._body == {
+        'query': {
+            'range': {
+                'ns3.test_date': {
+                    'gte': 'now-10d/d',
+                    'lte': 'now-10d/d'
+                }
+            }
+        }
+    }
+
+
+def test_age_query_fractional(df):
+    df = df[df.ns3.test_date.age < 1.5]
+    assert df._body == {
+        'query': {
+            'range': {
+                'ns3.test_date': {
+                    'gt': 'now-129600s/d'
+                }
+            }
+        }
+    }
+
+
+def test_age_query_rounding(df):
+    df = df[df.ns3.test_date.age.round('h', time_zone='+01:00') > 10]
+    assert df._body == {
+        'query': {
+            'range': {
+                'ns3.test_date': {
+                    'lt': 'now-10d/h',
+                    'time_zone': '+01:00'
+                }
+            }
+        }
+    }
+    matches = list(df.collect())
+    assert len(matches) == 3
+
+
+def test_age_query_no_rounding(df):
+    df = df[df.ns3.test_date.age.round(None) > 10]
+    assert df._body['query']['range']['ns3.test_date'] == {'lt': 'now-10d'}
+
+
 def test_age_query_inverted(df):
     days = 10
     df = ~df[df.ns3.test_date.age >= days]
@@ -1880,3 +1931,39 @@ def test_and_filter_plus_conditions(df):
         }
     }
     list(df.collect())  # assert no query error
+
+
+def test_scripted_query_params(df):
+    source = "doc['ns1.attr1'].value > params.threshold"
+    df = df[df.query(source, params={'threshold': 5})]
+    assert df._body == {
+        'query': {
+            'script': {
+                'script': {
+                    'lang': 'painless',
+                    'source': "doc['ns1.attr1'].value > params.threshold",
+                    'params': {'threshold': 5}
+                }
+            }
+        }
+    }
+    assert len(list(df.collect())) == 1
+
+
+def test_stored_script_query(df):
+    df.register_script('bamboo-test-threshold', "doc['ns1.attr1'].value > params.threshold")
+    try:
+        df = df[df.query(id='bamboo-test-threshold', params={'threshold': 5})]
+        assert df._body == {
+            'query': {
+                'script': {
+                    'script': {
+                        'id': 'bamboo-test-threshold',
+                        'params': {'threshold': 5}
+                    }
+                }
+            }
+        }
+        assert len(list(df.collect())) == 1
+    finally:
+        df._es.delete_script(id='bamboo-test-threshold')
@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+from bamboo.config import Config
+from bamboo.serializer import JSON_LIBRARIES, Serializer, dumps, json_codec
+from elasticsearch.exceptions import SerializationError
+
+
+def _installed():
+    for name in JSON_LIBRARIES:
+        try:
+            json_codec(name)
+        except ImportError:
+            continue
+        yield name
+
+
+@pytest.fixture(params=list(_installed()))
+def serializer(request):
+    return Serializer(request.param)
+
+
+def test_dumps_matches_json(serializer):
+    data = {'a': [1, 2.5, None, True], 'b': {'c': u'é/'}, 1: 'key',
+            'date': datetime.datetime(2020, 1, 2, 3, 4, 5, 6), 'big': 2 ** 70}
+    assert serializer.dumps(data) == dumps(data)
+    # without the big integer, which alone makes every library fall back
+    data = {'a': [1.5, {'nan': float('nan')}], 'inf': float('inf'), '-inf': float('-inf')}
+    assert serializer.dumps(data) == dumps(data)
+
+
+def test_loads(serializer):
+    assert serializer.loads('{"hits":{"hits":[{"_source":{"a":1.5,"b":"\\u00e9"}}]}}') \
+        == {'hits': {'hits': [{'_source': {'a': 1.5, 'b': u'é'}}]}}
+
+
+def test_loads_invalid(serializer):
+    with pytest.raises(SerializationError):
+        serializer.loads('{"a":')
+
+
+def test_fastest_installed():
+    assert Serializer().library == next(_installed())
+
+
+def test_unknown_library():
+    with pytest.raises(ValueError):
+        Serializer('yaml')
+
+
+def test_config_json_library():
+    config = Config(hosts=['localhost'], json_library='json')
+    assert config.connection.transport.serializer.library == 'json'
@@ -0,0 +1,25 @@
+import pickle
+
+import pandas as pd
+
+from bamboo.slices import Slice, load_frame, read_frame
+
+
+def test_slice_pickles():
+    s = Slice('index', {'query': {'match_all': {}}}, id=1, max=4,
+              fields=['a'], connection={'hosts': ['localhost']}, options={'routing': 'x'})
+    copy = pickle.loads(pickle.dumps(s))
+    assert vars(copy) == vars(s)
+    assert copy._es is s._es
+
+
+class FrameSlice(Slice):
+    def to_pandas(self):
+        return pd.DataFrame({'a': [1, 2], 'b': ['x', None], 'c': [[1], 2]})
+
+
+def test_read_frame_round_trip():
+    frame = FrameSlice('index', {}).to_pandas()
+    serialized = read_frame(FrameSlice('index', {}))
+    assert serialized[0] in ('arrow', 'pickle')
+    pd.testing.assert_frame_equal(load_frame(serialized), frame)
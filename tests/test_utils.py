@@ -0,0 +1,44 @@
+import pytest
+
+from bamboo.utils import nested_to_dot, prefetch, to_columns
+
+
+def test_prefetch():
+    assert list(prefetch(iter(range(10)))) == list(range(10))
+
+
+def test_prefetch_raises():
+    def produce():
+        yield 1
+        raise ValueError
+
+    items = prefetch(produce())
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_to_columns():
+    pd = pytest.importorskip('pandas')
+    docs = [{'a': 1, 'ns': {'b': 'x'}}, {'c': True},
+            {'a': 2, 'ns': {'b': 'y', 'd': {'e': 1.5}}}, {}]
+    columns, count = to_columns(iter(docs))
+    assert list(columns) == ['a', 'ns.b', 'c', 'ns.d.e']
+    assert count == len(docs)
+    assert all(len(i) == len(docs) for i in columns.values())
+    assert pd.DataFrame(columns).equals(pd.DataFrame([nested_to_dot(i) for i in docs]))
+
+
+def test_to_columns_dotted_and_object():
+    docs = [{'a.b': 1, 'a': {'b': 2}}, {'a': {'b': 3}}]
+    columns, count = to_columns(docs)
+    assert columns == {'a.b': [2, 3]}
+    assert [nested_to_dot(i)['a.b'] for i in docs] == columns['a.b']
+
+
+def test_to_columns_empty_sources():
+    pd = pytest.importorskip('pandas')
+    docs = [{}, {}, {}]
+    columns, count = to_columns(docs)
+    assert not columns and count == len(docs)
+    assert pd.DataFrame(columns, index=pd.RangeIndex(count)).equals(pd.DataFrame(docs))